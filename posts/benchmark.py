@@ -0,0 +1,316 @@
+"""Нагрузочный бенчмарк маршрутов posts.urls.
+
+build_dataset заполняет базу правдоподобными данными: популярность
+авторов распределена по закону Ципфа, поэтому у немногих авторов много
+постов, комментариев и подписчиков, а у большинства — единицы.
+run прогоняет маршруты через тестовый клиент Django в том же процессе
+и собирает время ответа, число SQL-запросов и размер ответа; compare
+сравнивает результат с сохранённым эталоном.
+
+Запускается командой benchmark, которая создаёт для этого отдельную
+тестовую базу. follow_graph_footprint (команда benchmark_follow_graph)
+без базы измеряет память и скорость графа подписок follow_graph.
+"""
+import contextlib
+import io
+import random
+import statistics
+import time
+import tracemalloc
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .follow_graph import FollowGraph
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+SCALES = {
+    "small": {"users": 200, "groups": 10, "posts": 5000,
+              "comments": 10000, "follows": 15},
+    "medium": {"users": 2000, "groups": 30, "posts": 50000,
+               "comments": 100000, "follows": 30},
+    "large": {"users": 5000, "groups": 50, "posts": 300000,
+              "comments": 600000, "follows": 50},
+}
+ROUTES = ("index", "index_deep", "group_posts", "profile", "post_view",
+          "follow_index", "search", "add_comment")
+METRICS = ("p50", "p95", "p99", "queries", "bytes")
+BATCH_SIZE = 2000
+WORDS = ("кот", "погода", "новости", "программирование", "музыка", "книги",
+         "путешествие", "рецепт", "спорт", "кино", "город", "работа",
+         "утро", "выходные", "фотография", "друзья")
+
+
+@contextlib.contextmanager
+def explicit_dates(*fields):
+    """Позволяет задать даты полей с auto_now_add при bulk_create."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def zipf_weights(size, exponent=1.1):
+    return list(accumulate(1 / (rank ** exponent)
+                           for rank in range(1, size + 1)))
+
+
+def sentence(rnd, words=12):
+    return " ".join(rnd.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def build_dataset(users, groups, posts, comments, follows, seed=0):
+    """follows — среднее число подписок пользователя."""
+    rnd = random.Random(seed)
+    now = timezone.now()
+    password = make_password(None)
+    with transaction.atomic():
+        User.objects.bulk_create(
+            [User(username=f"user{i}", password=password)
+             for i in range(users)])
+        user_ids = list(User.objects.order_by("pk")
+                        .values_list("pk", flat=True))
+        Group.objects.bulk_create(
+            [Group(title=f"Группа {i}", slug=f"group-{i}",
+                   description=sentence(rnd))
+             for i in range(groups)])
+        group_ids = list(Group.objects.values_list("pk", flat=True))
+        weights = zipf_weights(len(user_ids))
+
+        follow_pairs = set()
+        for user_id in user_ids:
+            amount = min(int(rnd.paretovariate(1.5) * follows / 3),
+                         len(user_ids) - 1)
+            for author_id in rnd.choices(user_ids, cum_weights=weights,
+                                         k=amount):
+                if author_id != user_id:
+                    follow_pairs.add((user_id, author_id))
+        Follow.objects.bulk_create(
+            [Follow(user_id=user_id, author_id=author_id)
+             for user_id, author_id in follow_pairs])
+
+        # Посты идут равномерно за последний год, старые — первыми.
+        step = timedelta(days=365) / max(posts, 1)
+        authors = rnd.choices(user_ids, cum_weights=weights, k=posts)
+        with explicit_dates(Post._meta.get_field("pub_date")):
+            for start in range(0, posts, BATCH_SIZE):
+                Post.objects.bulk_create([
+                    Post(title=sentence(rnd, 3), text=sentence(rnd),
+                         author_id=authors[i],
+                         group_id=(rnd.choice(group_ids)
+                                   if rnd.random() < 0.5 else None),
+                         pub_date=now - step * (posts - i))
+                    for i in range(start, min(start + BATCH_SIZE, posts))])
+        post_ids = list(Post.objects.order_by("pk")
+                        .values_list("pk", flat=True))
+        # Свежие посты комментируют чаще.
+        post_weights = zipf_weights(len(post_ids), exponent=0.8)
+        with explicit_dates(Comment._meta.get_field("created")):
+            for start in range(0, comments, BATCH_SIZE):
+                amount = min(BATCH_SIZE, comments - start)
+                Comment.objects.bulk_create([
+                    Comment(post_id=post_id,
+                            author_id=rnd.choice(user_ids),
+                            text=sentence(rnd, 6), created=now)
+                    for post_id in rnd.choices(post_ids[::-1],
+                                               cum_weights=post_weights,
+                                               k=amount)])
+
+        # bulk_create не вызывает сигналы, поэтому производные данные
+        # пересобираются целиком.
+        for command in ("recount_stats", "rebuild_timelines",
+                        "rebuild_search_index"):
+            call_command(command, stdout=io.StringIO())
+    return {"users": users, "groups": groups, "posts": posts,
+            "comments": comments, "follows": len(follow_pairs)}
+
+
+class Scenario:
+    """Выбирает адреса для маршрутов: популярные авторы и посты
+    выбираются чаще, как и в реальном трафике."""
+
+    def __init__(self, seed=0):
+        self.rnd = random.Random(seed)
+        self.authors = list(User.objects.order_by("pk")
+                            .values_list("username", flat=True))
+        self.weights = zipf_weights(len(self.authors))
+        self.groups = list(Group.objects.values_list("slug", flat=True))
+        self.posts = list(Post.objects.order_by("-pub_date")
+                          .values_list("pk", "author__username")[:1000])
+        self.reader = (User.objects.order_by("-stats__following_count")
+                       .first())
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.client = Client()
+
+    def author(self):
+        return self.rnd.choices(self.authors, cum_weights=self.weights)[0]
+
+    def post(self):
+        return self.rnd.choice(self.posts)
+
+    def request(self, route):
+        """Возвращает клиента, метод, адрес и данные запроса."""
+        if route == "index":
+            return self.client, "get", reverse("index"), {}
+        if route == "index_deep":
+            return (self.client, "get", reverse("index"),
+                    {"page": self.rnd.randint(2, 50)})
+        if route == "group_posts":
+            return (self.client, "get",
+                    reverse("group", args=[self.rnd.choice(self.groups)]),
+                    {})
+        if route == "profile":
+            return (self.client, "get",
+                    reverse("profile", args=[self.author()]), {})
+        if route == "post_view":
+            post_id, username = self.post()
+            return (self.client, "get",
+                    reverse("post", args=[username, post_id]), {})
+        if route == "follow_index":
+            return self.reader_client, "get", reverse("follow_index"), {}
+        if route == "search":
+            return (self.client, "get", reverse("search"),
+                    {"q": self.rnd.choice(WORDS)})
+        if route == "add_comment":
+            post_id, username = self.post()
+            return (self.reader_client, "post",
+                    reverse("add_comment", args=[username, post_id]),
+                    {"text": sentence(self.rnd, 6)})
+        raise ValueError(f"Неизвестный маршрут {route}")
+
+
+def percentile(values, share):
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1,
+                       round(share * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def measure(scenario, route, iterations, warmup=3, cold=False):
+    timings, queries, sizes = [], [], []
+    for i in range(warmup + iterations):
+        client, method, url, data = scenario.request(route)
+        if cold:
+            for cache in caches.all():
+                cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            start = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            elapsed = time.perf_counter() - start
+        if response.status_code not in (200, 302):
+            raise RuntimeError(
+                f"{route}: {url} вернул {response.status_code}")
+        if i >= warmup:
+            timings.append(elapsed * 1000)
+            queries.append(len(context.captured_queries))
+            sizes.append(len(response.content))
+    return {
+        "requests": iterations,
+        "p50": round(percentile(timings, 0.50), 3),
+        "p95": round(percentile(timings, 0.95), 3),
+        "p99": round(percentile(timings, 0.99), 3),
+        "mean": round(statistics.mean(timings), 3),
+        "queries": round(statistics.mean(queries), 2),
+        "bytes": round(statistics.mean(sizes)),
+    }
+
+
+def run(routes=ROUTES, iterations=50, seed=0, cold=False):
+    scenario = Scenario(seed)
+    for cache in caches.all():
+        cache.clear()
+    return {route: measure(scenario, route, iterations, cold=cold)
+            for route in routes}
+
+
+def compare(results, baseline, threshold=0.1):
+    """Строки сравнения (маршрут, метрика, было, стало, изменение)
+    и список ухудшений больше threshold по p95 и числу запросов."""
+    rows, regressions = [], []
+    for route, current in results.items():
+        previous = baseline.get(route)
+        if previous is None:
+            continue
+        for metric in METRICS:
+            before, after = previous.get(metric), current.get(metric)
+            if before is None or after is None:
+                continue
+            change = (after - before) / before if before else 0.0
+            rows.append((route, metric, before, after, change))
+            if metric in ("p95", "queries") and change > threshold:
+                regressions.append((route, metric, before, after, change))
+    return rows, regressions
+
+
+def follow_edges(edges, users, seed=0):
+    """edges подписок без повторов; популярность авторов — по Ципфу."""
+    rnd = random.Random(seed)
+    weights = zipf_weights(users)
+    pairs = set()
+    while len(pairs) < edges:
+        batch = edges - len(pairs)
+        for user, author in zip(
+                rnd.choices(range(1, users + 1), k=batch),
+                rnd.choices(range(1, users + 1), cum_weights=weights,
+                            k=batch)):
+            if user != author:
+                pairs.add((user, author))
+    return pairs
+
+
+def follow_graph_footprint(edges=1_000_000, users=100_000, lookups=100_000,
+                           seed=0):
+    """Память и скорость FollowGraph на синтетическом графе. Для
+    сравнения set_bytes — хэш-таблица set из тех же пар, без памяти
+    самих кортежей."""
+    pairs = follow_edges(edges, users, seed)
+    tracemalloc.start()
+    start = time.perf_counter()
+    graph = FollowGraph(pairs)
+    build = time.perf_counter() - start
+    allocated = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    baseline = set(pairs)
+    set_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del baseline
+
+    rnd = random.Random(seed)
+    probes = [(rnd.randint(1, users), rnd.randint(1, users))
+              for _ in range(lookups)]
+    start = time.perf_counter()
+    for user, author in probes:
+        graph.follows(user, author)
+    follows_ns = (time.perf_counter() - start) / lookups * 1e9
+    start = time.perf_counter()
+    for user, _ in probes:
+        graph.followers_count(user)
+    degree_ns = (time.perf_counter() - start) / lookups * 1e9
+    return {
+        "edges": len(pairs),
+        "users": users,
+        "array_bytes": graph.nbytes,
+        "allocated_bytes": allocated,
+        "bytes_per_edge": round(allocated / len(pairs), 2),
+        "set_bytes": set_bytes,
+        "build_seconds": round(build, 3),
+        "follows_ns": round(follows_ns),
+        "degree_ns": round(degree_ns),
+    }
@@ -0,0 +1,141 @@
+"""Валидаторы условных GET-запросов для страниц поста, профиля и группы.
+
+Каждая функция делает один запрос к базе без рендеринга шаблона.
+ETag учитывает всё, от чего зависит страница: данные постов (время
+последнего изменения и число), счётчики автора, названия групп,
+подписку текущего пользователя на автора, самого пользователя, его
+CSRF-cookie (токен есть в формах страницы), номер страницы и версию
+выкладки ETAG_SALT. Last-Modified не отдаётся: у счётчиков, подписок
+и групп нет времени изменения, и по одной дате поста страница
+считалась бы свежей после их правки.
+"""
+import hashlib
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import (BooleanField, Count, DateTimeField, Exists,
+                              IntegerField, Max, OuterRef, Subquery, Value)
+
+from . import feed_cache
+from .models import Follow, Group, Post
+
+User = get_user_model()
+
+SAFE_METHODS = ("GET", "HEAD")
+
+
+def is_conditional(request):
+    return request.method in SAFE_METHODS
+
+
+def following(request, author_ref):
+    if not request.user.is_authenticated:
+        return Value(False, output_field=BooleanField())
+    return Exists(Follow.objects.filter(user=request.user,
+                                        author=OuterRef(author_ref)))
+
+
+def first(queryset):
+    # first() добавил бы сортировку по pk, а с GROUP BY это лишняя
+    # сортировка во временном B-дереве.
+    rows = list(queryset.order_by()[:1])
+    return rows[0] if rows else None
+
+
+def make_etag(request, *parts):
+    user = request.user
+    parts += (
+        user.pk if user.is_authenticated else 0,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        request.GET.urlencode(),
+        settings.ETAG_SALT,
+    )
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def get_post(request, username, post_id):
+    """Пост автора из адреса вместе с автором, его счётчиками, группой
+    и полем is_following. Запоминается в запросе: валидаторам и
+    представлению хватает одного запроса."""
+    if not hasattr(request, "_post_detail"):
+        request._post_detail = first(
+            Post.objects.for_feed().select_related("author__stats")
+            .filter(pk=post_id, author__username=username)
+            .annotate(is_following=following(request, "author")))
+    return request._post_detail
+
+
+def post_etag(request, username, post_id):
+    if not is_conditional(request):
+        return None
+    post = get_post(request, username, post_id)
+    if post is None:
+        return None
+    stats = getattr(post.author, "stats", None)
+    counters = stats and (stats.posts_count, stats.followers_count,
+                          stats.following_count)
+    group = post.group and (post.group.slug, post.group.title)
+    return make_etag(request, "post", post_id, post.updated, counters,
+                     group, post.is_following)
+
+
+def posts_subquery(aggregate, output_field, **lookup):
+    """Агрегат по постам внутри коррелированного подзапроса: группировка
+    по внешнему ключу идёт по составному индексу без сортировки."""
+    field = next(iter(lookup))
+    return Subquery(
+        Post.objects.filter(**lookup).order_by().values(field)
+        .annotate(value=aggregate).values("value"),
+        output_field=output_field)
+
+
+def get_author(request, username):
+    """Автор профиля с полями last_update и is_following. Запоминается
+    в запросе, чтобы валидаторы и представление обошлись одним запросом."""
+    if not hasattr(request, "_profile_author"):
+        request._profile_author = first(
+            User.objects.select_related("stats").filter(username=username)
+            .annotate(
+                last_update=posts_subquery(Max("updated"), DateTimeField(),
+                                           author=OuterRef("pk")),
+                is_following=following(request, "pk")))
+    return request._profile_author
+
+
+def profile_etag(request, username):
+    if not is_conditional(request):
+        return None
+    author = get_author(request, username)
+    if author is None:
+        return None
+    stats = getattr(author, "stats", None)
+    counters = stats and (stats.posts_count, stats.followers_count,
+                          stats.following_count)
+    # Переименование группы меняет подписи постов в профиле, но не сами
+    # посты: его отражает версия групп.
+    groups_version, = feed_cache.get_versions(feed_cache.GROUPS)
+    return make_etag(request, "profile", author.pk, author.last_update,
+                     counters, groups_version, author.is_following)
+
+
+def get_group(request, slug):
+    """Группа с временем последнего изменения её постов и их числом."""
+    if not hasattr(request, "_group"):
+        request._group = first(
+            Group.objects.filter(slug=slug).annotate(
+                last_update=posts_subquery(Max("updated"), DateTimeField(),
+                                           group=OuterRef("pk")),
+                posts_amount=posts_subquery(Count("pk"), IntegerField(),
+                                            group=OuterRef("pk"))))
+    return request._group
+
+
+def group_etag(request, slug):
+    """Только ETag: правка описания группы не оставляет времени
+    изменения, поэтому в ETag входят сами поля группы."""
+    if not is_conditional(request):
+        return None
+    group = get_group(request, slug)
+    return group and make_etag(request, "group", group.pk, group.title,
+                               group.description, group.last_update,
+                               group.posts_amount)
@@ -0,0 +1,7 @@
+from .follows import FollowedAuthors
+
+
+def followed_authors(request):
+    return {
+        "followed_authors": FollowedAuthors(request.user),
+    }
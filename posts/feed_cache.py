@@ -0,0 +1,57 @@
+"""Ключи фрагментного кэша лент.
+
+Ключ фрагмента содержит номера версий областей (scope), от которых
+зависит лента. Сигналы увеличивают версию при изменении данных, поэтому
+устаревшие фрагменты просто перестают читаться и вытесняются по TTL.
+"""
+import time
+
+from django.core.cache import cache
+
+PAGE_PARAMS = ("page", "before", "after")
+POSTS = "posts"
+GROUPS = "groups"
+# Не ключ фрагментов: версия списка популярных авторов (posts.timeline).
+CELEBRITIES = "celebrities"
+
+
+def follow_scope(user_id):
+    return f"follow:{user_id}"
+
+
+def initial_version():
+    # Версия могла быть вытеснена из кэша: начинаем с нового значения,
+    # чтобы не воскресить фрагменты, сохранённые под старыми номерами.
+    return int(time.time() * 1000)
+
+
+def version_key(scope):
+    return f"feed_version:{scope}"
+
+
+def get_versions(*scopes):
+    keys = [version_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = {key: initial_version() for key in keys
+               if key not in versions}
+    if missing:
+        cache.set_many(missing, None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump(scope):
+    """Увеличивает версию области и возвращает новую."""
+    key = version_key(scope)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = initial_version()
+        cache.set(key, version, None)
+        return version
+
+
+def fragment_key(request, feed, *parts, scopes=(POSTS,)):
+    page = ",".join(request.GET.get(name, "") for name in PAGE_PARAMS)
+    return ":".join(
+        str(part) for part in (feed, *parts, *get_versions(*scopes), page))
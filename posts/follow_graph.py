@@ -0,0 +1,332 @@
+"""Граф подписок в памяти процесса.
+
+Подписки обоих направлений хранятся в формате CSR в массивах array
+из 32-битных чисел: строка пользователя — отсортированные id соседей.
+indptr индексируется самим id пользователя (id идут подряд), поэтому
+степень узла — O(1), а «подписан ли A на B» — бинарный поиск в строке
+A за O(log n). Миллион подписок занимает около 8 МБ.
+
+Изменения после загрузки копятся в небольшой дельте (множества
+добавленных и удалённых пар и поправки степеней) и вливаются в массивы
+в фоновом потоке, когда дельта вырастает до FOLLOW_GRAPH_DELTA_LIMIT.
+Сигналы Follow применяют изменения после фиксации транзакции.
+
+Каждый процесс держит свою копию. Общая версия в кэше показывает, менял
+ли подписки кто-то ещё; тогда граф перечитывается из базы, но не чаще
+раза в FOLLOW_GRAPH_MAX_STALENESS секунд. Перезагрузка идёт в фоновом
+потоке: запросы тем временем читают прежний граф, а изменения,
+пришедшие во время загрузки, повторяются на новом графе перед заменой.
+
+До перезагрузки граф может не знать о подписках из других процессов.
+Для каждого пользователя в кэше хранится общая версия его последнего
+изменения; graph_for отдаёт граф, только если тот её уже учитывает,
+иначе вызывающий читает подписки пользователя из базы. Включается
+настройкой FOLLOW_GRAPH_ENABLED.
+"""
+import logging
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from heapq import merge
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from . import feed_cache
+from .models import Follow
+
+logger = logging.getLogger(__name__)
+
+SCOPE = "follow_graph"
+TYPECODE = "I"
+
+_graph = None
+_lock = threading.Lock()
+# Пока идёт фоновая перезагрузка — поток и изменения, пришедшие за это
+# время; иначе None.
+_reload_thread = None
+_pending = None
+
+
+def user_key(user_id):
+    # Ключ с префиксом версий читается мимо L1 кэша процесса.
+    return feed_cache.version_key(f"{SCOPE}:user:{user_id}")
+
+
+class Adjacency:
+    """Списки смежности одного направления."""
+
+    def __init__(self, pairs):
+        """pairs — пары (строка, сосед), отсортированные по возрастанию."""
+        self.indptr = array(TYPECODE)
+        self.indices = array(TYPECODE)
+        for row, column in pairs:
+            while len(self.indptr) <= row:
+                self.indptr.append(len(self.indices))
+            self.indices.append(column)
+        self.indptr.append(len(self.indices))
+
+    def bounds(self, row):
+        if row + 1 >= len(self.indptr):
+            return 0, 0
+        return self.indptr[row], self.indptr[row + 1]
+
+    def degree(self, row):
+        start, end = self.bounds(row)
+        return end - start
+
+    def __contains__(self, pair):
+        row, column = pair
+        start, end = self.bounds(row)
+        index = bisect_left(self.indices, column, start, end)
+        return index < end and self.indices[index] == column
+
+    def row(self, row):
+        start, end = self.bounds(row)
+        return self.indices[start:end]
+
+    def pairs(self):
+        for row in range(len(self.indptr) - 1):
+            for column in self.row(row):
+                yield row, column
+
+    @property
+    def nbytes(self):
+        return (self.indptr.itemsize * len(self.indptr)
+                + self.indices.itemsize * len(self.indices))
+
+
+class FollowGraph:
+    def __init__(self, edges, version=None):
+        """edges — пары (user_id, author_id) без повторов."""
+        edges = sorted(edges)
+        self.following = Adjacency(edges)
+        self.followers = Adjacency(
+            sorted((author, user) for user, author in edges))
+        self.version = version
+        # Версии изменений, применённых в этом процессе, по пользователям.
+        self.applied = {}
+        self.checked_at = time.monotonic()
+        self._reset_delta()
+        # Пока идёт слияние дельты — изменения, пришедшие за это время.
+        self._journal = None
+        self.compactor = None
+        self._lock = threading.RLock()
+
+    @classmethod
+    def load(cls):
+        # Версия читается до подписок: изменение во время загрузки
+        # не пропадёт, а вызовет ещё одну перезагрузку.
+        version, = feed_cache.get_versions(SCOPE)
+        edges = Follow.objects.order_by().values_list("user_id",
+                                                      "author_id")
+        return cls(edges.iterator(), version)
+
+    def _reset_delta(self):
+        self.added = set()
+        self.removed = set()
+        self.following_delta = defaultdict(int)
+        self.followers_delta = defaultdict(int)
+
+    # Дельту меняют хуки on_commit других потоков, поэтому чтения
+    # берут блокировку графа, а не обходят множества без неё.
+
+    def follows(self, user_id, author_id):
+        pair = (user_id, author_id)
+        with self._lock:
+            if pair in self.added:
+                return True
+            return pair not in self.removed and pair in self.following
+
+    def following_count(self, user_id):
+        with self._lock:
+            return (self.following.degree(user_id)
+                    + self.following_delta.get(user_id, 0))
+
+    def followers_count(self, author_id):
+        with self._lock:
+            return (self.followers.degree(author_id)
+                    + self.followers_delta.get(author_id, 0))
+
+    def following_ids(self, user_id):
+        """Отсортированные id авторов, на которых подписан user_id."""
+        with self._lock:
+            ids = self.following.row(user_id)
+            if user_id not in self.following_delta:
+                return ids
+            return array(TYPECODE, sorted(
+                {author for author in ids
+                 if (user_id, author) not in self.removed}
+                | {author for user, author in self.added
+                   if user == user_id}))
+
+    def apply(self, user_id, author_id, following, version=None):
+        """Добавляет или удаляет подписку. version — общая версия после
+        изменения: если она ушла дальше чем на единицу, подписки менял
+        другой процесс, и граф перечитается при следующей проверке."""
+        with self._lock:
+            if version is not None:
+                self.applied[user_id] = version
+            if (version is not None and self.version is not None
+                    and version == self.version + 1):
+                self.version = version
+            if self._journal is not None:
+                self._journal.append((user_id, author_id, following))
+            self._change(user_id, author_id, following)
+            if (len(self.added) + len(self.removed)
+                    >= settings.FOLLOW_GRAPH_DELTA_LIMIT):
+                self.compact(background=True)
+
+    def _change(self, user_id, author_id, following):
+        """Меняет дельту; вызывается под блокировкой."""
+        if self.follows(user_id, author_id) == following:
+            return
+        pair = (user_id, author_id)
+        if following:
+            if pair in self.removed:
+                self.removed.discard(pair)
+            else:
+                self.added.add(pair)
+        else:
+            if pair in self.added:
+                self.added.discard(pair)
+            else:
+                self.removed.add(pair)
+        change = 1 if following else -1
+        self.following_delta[user_id] += change
+        self.followers_delta[author_id] += change
+
+    def compact(self, background=False):
+        """Вливает дельту в массивы. Массивы строятся без блокировки по
+        снимку дельты; изменения, пришедшие за это время, копятся
+        в журнале и повторяются поверх новых массивов при замене."""
+        with self._lock:
+            if self._journal is not None:
+                return
+            self._journal = []
+            snapshot = (self.following, sorted(self.added),
+                        set(self.removed))
+        if not background:
+            self._merge(*snapshot)
+            return
+        self.compactor = threading.Thread(
+            target=self._merge, args=snapshot, name="follow-graph-compact",
+            daemon=True)
+        self.compactor.start()
+
+    def _merge(self, current, added, removed):
+        try:
+            edges = list(merge(
+                (pair for pair in current.pairs() if pair not in removed),
+                added))
+            following = Adjacency(edges)
+            followers = Adjacency(
+                sorted((author, user) for user, author in edges))
+        except Exception:
+            logger.exception("Не удалось слить дельту графа подписок")
+            with self._lock:
+                self._journal = None
+            return
+        with self._lock:
+            journal, self._journal = self._journal, None
+            self.following, self.followers = following, followers
+            self._reset_delta()
+            for change in journal:
+                self._change(*change)
+
+    def is_current_for(self, user_id, changed):
+        """Учитывает ли граф изменение подписок user_id с версией
+        changed."""
+        if changed is None or self.version is None:
+            return True
+        return changed <= max(self.version, self.applied.get(user_id, 0))
+
+    def needs_reload(self):
+        now = time.monotonic()
+        if now - self.checked_at < settings.FOLLOW_GRAPH_MAX_STALENESS:
+            return False
+        self.checked_at = now
+        return feed_cache.get_versions(SCOPE)[0] != self.version
+
+    @property
+    def nbytes(self):
+        """Размер массивов; дельта невелика и не учитывается."""
+        return self.following.nbytes + self.followers.nbytes
+
+
+def get_graph():
+    """Граф процесса или None, если он выключен. Загружается при первом
+    обращении; wsgi.py обращается к нему при старте."""
+    global _graph
+    if not settings.FOLLOW_GRAPH_ENABLED:
+        return None
+    graph = _graph
+    if graph is None:
+        with _lock:
+            if _graph is None:
+                _graph = FollowGraph.load()
+            graph = _graph
+    elif graph.needs_reload():
+        start_reload()
+    return graph
+
+
+def graph_for(user_id):
+    """Граф, если он знает о последнем изменении подписок user_id, иначе
+    None: подписки пользователя менял другой процесс после загрузки."""
+    graph = get_graph()
+    if graph is not None and not graph.is_current_for(
+            user_id, cache.get(user_key(user_id))):
+        return None
+    return graph
+
+
+def start_reload():
+    global _reload_thread, _pending
+    with _lock:
+        if _pending is not None:
+            return
+        _pending = []
+        _reload_thread = threading.Thread(
+            target=reload, name="follow-graph-reload", daemon=True)
+    _reload_thread.start()
+
+
+def reload():
+    """Загружает граф заново и подменяет им граф процесса."""
+    global _graph, _pending
+    try:
+        graph = FollowGraph.load()
+    except Exception:
+        logger.exception("Не удалось перезагрузить граф подписок")
+        graph = None
+    finally:
+        connection.close()
+    with _lock:
+        if graph is not None:
+            for change in _pending:
+                graph.apply(*change)
+            _graph = graph
+        _pending = None
+
+
+def follow_changed(user_id, author_id, following):
+    """Вызывается сигналами Follow после фиксации транзакции."""
+    version = feed_cache.bump(SCOPE)
+    cache.set(user_key(user_id), version, None)
+    with _lock:
+        if _pending is not None:
+            _pending.append((user_id, author_id, following, version))
+        graph = _graph
+    if graph is not None:
+        graph.apply(user_id, author_id, following, version)
+
+
+def reset():
+    global _graph, _reload_thread, _pending
+    if _reload_thread is not None:
+        _reload_thread.join()
+    _graph = _reload_thread = _pending = None
@@ -0,0 +1,123 @@
+"""Подписки на авторов.
+
+follow и unfollow обходятся одной записью в базу: вставкой, повтор
+которой отклоняет уникальное ограничение Follow, и удалением по фильтру
+без предварительного exists(). Гонка двух одновременных подписок
+заканчивается одной записью без ошибки. Счётчики, ленты и кэши
+обновляют сигналы Follow.
+
+FollowedAuthors отвечает, подписан ли пользователь на автора, для
+любого числа авторов на странице: id всех его авторов читаются одним
+запросом в отсортированный массив и кэшируются под версией его ленты
+подписок, которую сигналы Follow увеличивают. С включённым графом
+подписок в памяти (follow_graph) проверка обходится без базы, если
+граф уже знает о последних изменениях подписок пользователя.
+
+follow_list_page строит страницу подписчиков или подписок автора
+курсорами по Follow.created. Списки популярных авторов кэшируются на
+FOLLOW_LIST_CACHE_TIMEOUT без сброса при каждой подписке: иначе кэш
+сбрасывался бы постоянно.
+"""
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+
+from . import feed_cache, follow_graph
+from .models import Follow, UserStats
+from .paginators import CursorPage, CursorPaginator
+
+# Отношение: (поле Follow с владельцем списка, поле с людьми в списке,
+# счётчик UserStats).
+RELATIONS = {
+    "followers": ("author", "user", "followers_count"),
+    "following": ("user", "author", "following_count"),
+}
+
+
+def follow(user, author):
+    """Возвращает True, если подписка создана."""
+    if user.pk == author.pk:
+        return False
+    try:
+        # Точка сохранения: ошибка не ломает внешнюю транзакцию.
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+    except IntegrityError:
+        return False
+    return True
+
+
+def unfollow(user, author):
+    """Возвращает True, если подписка была и удалена."""
+    deleted, _ = Follow.objects.filter(user=user, author=author).delete()
+    return deleted > 0
+
+
+def followers_count(author):
+    """Число подписчиков после подписки или отписки. Берётся из
+    UserStats, которые сигнал обновил в той же транзакции: граф узнаёт
+    об изменении только после её фиксации."""
+    return (UserStats.objects.filter(user=author)
+            .values_list("followers_count", flat=True).first() or 0)
+
+
+def followed_ids(user_id):
+    """Отсортированный array id авторов, на которых подписан
+    пользователь."""
+    version, = feed_cache.get_versions(feed_cache.follow_scope(user_id))
+    key = f"followed:{user_id}:{version}"
+    return cache.get_or_set(
+        key, lambda: array("q", Follow.objects.filter(user_id=user_id)
+                           .order_by("author_id")
+                           .values_list("author_id", flat=True)),
+        settings.FOLLOWED_AUTHORS_TIMEOUT)
+
+
+class FollowedAuthors:
+    """Авторы, на которых подписан пользователь: `author in followed`
+    принимает пользователя или его id. Загружается при первой проверке,
+    поэтому страницы без кнопок подписки запросов не делают."""
+
+    def __init__(self, user):
+        self.user = user
+        self._ids = None
+
+    def __contains__(self, author):
+        if not self.user.is_authenticated:
+            return False
+        if self._ids is None:
+            graph = follow_graph.graph_for(self.user.pk)
+            self._ids = (followed_ids(self.user.pk) if graph is None
+                         else graph.following_ids(self.user.pk))
+        author_id = getattr(author, "pk", author)
+        index = bisect_left(self._ids, author_id)
+        return index < len(self._ids) and self._ids[index] == author_id
+
+
+def follow_list_page(author, relation, before=None, after=None):
+    """Страница пользователей из списка relation автора; author должен
+    быть загружен со stats."""
+    owner, person, counter = RELATIONS[relation]
+    paginator = CursorPaginator(
+        Follow.objects.filter(**{owner: author}).select_related(person),
+        settings.FOLLOW_LIST_PER_PAGE, field="created")
+    stats = UserStats.for_user(author)
+    popular = (getattr(stats, counter)
+               >= settings.FOLLOW_LIST_CACHE_THRESHOLD)
+
+    def load():
+        page = paginator.get_page(before=before, after=after)
+        return ([getattr(follow, person) for follow in page],
+                page.previous_cursor, page.next_cursor)
+
+    if popular:
+        key = (f"follow_list:{relation}:{author.pk}:"
+               f"{before or ''}:{after or ''}")
+        object_list, *cursors = cache.get_or_set(
+            key, load, settings.FOLLOW_LIST_CACHE_TIMEOUT)
+    else:
+        object_list, *cursors = load()
+    return CursorPage(object_list, paginator, *cursors)
@@ -1,14 +1,71 @@
+import os
+from io import BytesIO
+
 from django import forms
+from django.conf import settings
 from django.core.files.images import get_image_dimensions
+from django.core.files.uploadedfile import SimpleUploadedFile, UploadedFile
+from django.template.defaultfilters import filesizeformat
+from PIL import Image, ImageOps
 
 from .models import Comment, Post
 
 
+def normalize_image(upload):
+    """Уменьшает изображение до POST_IMAGE_MAX_DIMENSION по большей
+    стороне и перекодирует его без метаданных. JPEG декодируется сразу
+    в уменьшенном масштабе, поэтому память ограничена итоговым размером.
+    GIF остаётся как есть, чтобы не потерять анимацию."""
+    upload.seek(0)
+    with Image.open(upload) as image:
+        if image.format == "GIF":
+            upload.seek(0)
+            return upload
+        limit = settings.POST_IMAGE_MAX_DIMENSION
+        image.draft("RGB", (limit, limit))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((limit, limit), Image.LANCZOS, reducing_gap=3.0)
+        has_alpha = (image.mode in ("RGBA", "LA", "PA")
+                     or "transparency" in image.info)
+        buffer = BytesIO()
+        if has_alpha:
+            image.convert("RGBA").save(buffer, "PNG", optimize=True)
+            extension, content_type = "png", "image/png"
+        else:
+            image.convert("RGB").save(
+                buffer, "JPEG", quality=settings.POST_IMAGE_QUALITY,
+                optimize=True, progressive=True)
+            extension, content_type = "jpg", "image/jpeg"
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    return SimpleUploadedFile(f"{name}.{extension}", buffer.getvalue(),
+                              content_type=content_type)
+
+
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
         fields = ("title", "text", "group", "image")
 
+    def clean_image(self):
+        image = self.cleaned_data.get("image")
+        if not isinstance(image, UploadedFile):
+            return image
+        if image.size > settings.POST_IMAGE_MAX_UPLOAD_SIZE:
+            raise forms.ValidationError(
+                "Файл слишком большой: максимум %s."
+                % filesizeformat(settings.POST_IMAGE_MAX_UPLOAD_SIZE))
+        # Размеры читаются из заголовка, до декодирования пикселей.
+        width, height = get_image_dimensions(image)
+        if not width or not height:
+            raise forms.ValidationError("Не удалось прочитать изображение.")
+        if width * height > settings.POST_IMAGE_MAX_PIXELS:
+            raise forms.ValidationError(
+                "Слишком большое разрешение изображения.")
+        try:
+            return normalize_image(image)
+        except (OSError, Image.DecompressionBombError):
+            raise forms.ValidationError("Не удалось обработать изображение.")
+
     def clean_text(self):
         data = self.cleaned_data["text"]
         if data is None:
@@ -0,0 +1,93 @@
+import json
+import platform
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import (setup_test_environment,
+                               teardown_test_environment)
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Заполняет отдельную тестовую базу данными и измеряет время "
+            "ответа, число запросов и размер страниц маршрутов posts.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", choices=benchmark.SCALES,
+                            default="small")
+        for name in ("users", "groups", "posts", "comments", "follows"):
+            parser.add_argument(f"--{name}", type=int,
+                                help="Переопределяет значение из --scale.")
+        parser.add_argument("--routes", nargs="+", choices=benchmark.ROUTES,
+                            default=benchmark.ROUTES)
+        parser.add_argument("--iterations", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--cold", action="store_true",
+                            help="Очищать кэши перед каждым запросом.")
+        parser.add_argument("--output", help="Сохранить результат в JSON.")
+        parser.add_argument("--baseline",
+                            help="JSON прошлого запуска для сравнения.")
+        parser.add_argument("--threshold", type=float, default=0.1,
+                            help="Допустимое ухудшение p95 и числа "
+                                 "запросов, доля.")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **options):
+        sizes = dict(benchmark.SCALES[options["scale"]])
+        for name in sizes:
+            if options[name] is not None:
+                sizes[name] = options[name]
+
+        # Как и тесты, замеры идут без DEBUG: так ближе к продакшену.
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0,
+                                                      serialize=False)
+        try:
+            self.stdout.write(f"Заполнение базы: {sizes}")
+            dataset = benchmark.build_dataset(seed=options["seed"], **sizes)
+            routes = benchmark.run(options["routes"], options["iterations"],
+                                   seed=options["seed"],
+                                   cold=options["cold"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        result = {
+            "meta": {"dataset": dataset, "iterations": options["iterations"],
+                     "seed": options["seed"], "cold": options["cold"],
+                     "python": platform.python_version(),
+                     "django": django.get_version(),
+                     "database": connection.vendor},
+            "routes": routes,
+        }
+        self.stdout.write(f"{'маршрут':<14}{'p50':>9}{'p95':>9}{'p99':>9}"
+                          f"{'запросы':>9}{'байты':>9}")
+        for route, row in routes.items():
+            self.stdout.write(
+                f"{route:<14}{row['p50']:>9.2f}{row['p95']:>9.2f}"
+                f"{row['p99']:>9.2f}{row['queries']:>9.1f}"
+                f"{row['bytes']:>9}")
+        if options["output"]:
+            with open(options["output"], "w") as output:
+                json.dump(result, output, ensure_ascii=False, indent=2)
+        if options["baseline"]:
+            self.compare(result, options)
+
+    def compare(self, result, options):
+        with open(options["baseline"]) as stored:
+            baseline = json.load(stored)
+        rows, regressions = benchmark.compare(
+            result["routes"], baseline["routes"], options["threshold"])
+        self.stdout.write("\nСравнение с эталоном:")
+        for route, metric, before, after, change in rows:
+            self.stdout.write(f"{route:<14}{metric:<9}{before:>10}"
+                              f"{after:>10}{change:>+9.1%}")
+        if regressions:
+            message = ", ".join(f"{route} {metric} {change:+.1%}"
+                                for route, metric, _, _, change
+                                in regressions)
+            if options["fail_on_regression"]:
+                raise CommandError(f"Ухудшения: {message}")
+            self.stderr.write(f"Ухудшения: {message}")
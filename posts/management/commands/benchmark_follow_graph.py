@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts import benchmark
+
+
+class Command(BaseCommand):
+    help = ("Измеряет память и скорость графа подписок в памяти "
+            "на синтетических данных; база не нужна.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--edges", type=int, default=1_000_000)
+        parser.add_argument("--users", type=int, default=100_000)
+        parser.add_argument("--lookups", type=int, default=100_000)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        result = benchmark.follow_graph_footprint(
+            options["edges"], options["users"], options["lookups"],
+            options["seed"])
+        for name, value in result.items():
+            self.stdout.write(f"{name:<16}{value:>14}")
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts import suggestions
+
+
+class Command(BaseCommand):
+    help = ("Пересчитывает рекомендации «Кого читать» по графу "
+            "подписок. Нужен numpy.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int,
+                            default=settings.FOLLOW_SUGGESTIONS_LIMIT,
+                            help="Рекомендаций на пользователя.")
+
+    def handle(self, *args, **options):
+        created = suggestions.compute(options["limit"])
+        self.stdout.write(f"Сохранено рекомендаций: {created}.")
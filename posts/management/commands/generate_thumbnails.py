@@ -0,0 +1,38 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+
+from posts import thumbnails
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = ("Создаёт варианты изображений постов разных размеров "
+            "и форматов в несколько потоков.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--force", action="store_true",
+                            help="Пересоздать уже существующие варианты.")
+
+    def handle(self, *args, **options):
+        names = (Post.objects.exclude(image="").exclude(image__isnull=True)
+                 .values_list("image", flat=True).distinct())
+        done = failed = 0
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {
+                pool.submit(thumbnails.generate, name,
+                            force=options["force"]): name
+                for name in names.iterator()
+            }
+            for future in as_completed(futures):
+                try:
+                    manifest = future.result()
+                except Exception as error:
+                    manifest = None
+                    self.stderr.write(f"{futures[future]}: {error}")
+                if manifest:
+                    done += 1
+                else:
+                    failed += 1
+        self.stdout.write(f"Готово: {done}, с ошибками: {failed}.")
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts import search
+
+
+class Command(BaseCommand):
+    help = "Перестраивает поисковый индекс постов и комментариев."
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        search.rebuild_index(backend)
+        self.stdout.write(f"Индекс {backend.name} перестроен.")
@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Пересобирает материализованные ленты подписок."
+
+    def add_arguments(self, parser):
+        parser.add_argument("usernames", nargs="*",
+                            help="Пользователи; по умолчанию все.")
+        parser.add_argument(
+            "--demoted", action="store_true",
+            help="Только разложить по лентам посты авторов, переставших "
+                 "быть популярными.")
+
+    def handle(self, *args, **options):
+        if options["demoted"]:
+            demoted = timeline.demote_pending()
+            self.stdout.write(f"Разложены посты авторов: {demoted}.")
+            return
+        users = User.objects.filter(follower__isnull=False).distinct()
+        if options["usernames"]:
+            users = User.objects.filter(username__in=options["usernames"])
+        rebuilt = 0
+        for user_id in users.values_list("pk", flat=True).iterator():
+            timeline.rebuild(user_id)
+            rebuilt += 1
+        self.stdout.write(f"Пересобрано лент: {rebuilt}.")
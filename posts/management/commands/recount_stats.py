@@ -0,0 +1,48 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from posts.models import Comment, Follow, Post, UserStats
+
+User = get_user_model()
+
+
+def count_subquery(queryset, field):
+    counted = (queryset.filter(**{field: OuterRef("pk")})
+               .order_by().values(field)
+               .annotate(amount=Count("pk")).values("amount"))
+    return Coalesce(Subquery(counted, output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = ("Пересчитывает счётчики постов, подписчиков, подписок "
+            "и комментариев.")
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        missing = User.objects.filter(stats__isnull=True)
+        created = UserStats.objects.bulk_create(
+            [UserStats(user=user) for user in missing.only("pk")],
+            batch_size=1000)
+
+        user_counters = {
+            "posts_count": count_subquery(Post.objects, "author"),
+            "followers_count": count_subquery(Follow.objects, "author"),
+            "following_count": count_subquery(Follow.objects, "user"),
+        }
+        changed_stats = UserStats.objects.exclude(
+            Q(**user_counters)).count()
+        UserStats.objects.update(**user_counters)
+
+        changed_posts = Post.objects.exclude(
+            comment_count=count_subquery(Comment.objects, "post")
+        ).count()
+        Post.objects.update(
+            comment_count=count_subquery(Comment.objects, "post"))
+
+        self.stdout.write(
+            f"Создано строк статистики: {len(created)}, "
+            f"исправлено: {changed_stats} пользователей, "
+            f"{changed_posts} постов.")
@@ -0,0 +1,46 @@
+# Generated by Django 2.2.6 on 2026-10-18 05:35
+
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def fill_timelines(apps, schema_editor):
+    """Раскладывает по лентам подписчиков последние TIMELINE_BACKFILL
+    постов каждого непопулярного автора, как при подписке."""
+    Follow = apps.get_model("posts", "Follow")
+    Post = apps.get_model("posts", "Post")
+    TimelineEntry = apps.get_model("posts", "TimelineEntry")
+    authors = Follow.objects.exclude(
+        author__stats__followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).order_by().values_list("author_id", flat=True).distinct()
+    batch = []
+    for author_id in authors.iterator():
+        posts = list(Post.objects.filter(author_id=author_id).order_by(
+            "-pub_date").values_list("pk", "pub_date")[
+                :settings.TIMELINE_BACKFILL])
+        if not posts:
+            continue
+        followers = Follow.objects.filter(
+            author_id=author_id).values_list("user_id", flat=True)
+        for user_id in followers.iterator():
+            batch.extend(TimelineEntry(user_id=user_id, post_id=pk,
+                                       author_id=author_id, pub_date=pub_date)
+                         for pk, pub_date in posts)
+            if len(batch) >= BATCH_SIZE:
+                TimelineEntry.objects.bulk_create(batch,
+                                                  ignore_conflicts=True)
+                batch = []
+    TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_timeline_order_tiebreak'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_timelines, migrations.RunPython.noop),
+    ]
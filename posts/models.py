@@ -25,6 +25,11 @@ class Group(models.Model):
         super().save(*args, **kwargs)
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        return self.select_related("author", "group")
+
+
 class Post(models.Model):
     title = models.TextField(default="Новый пост",
                              verbose_name="Название поста",
@@ -32,14 +37,30 @@ class Post(models.Model):
     text = models.TextField(verbose_name="Текст записи",
                             help_text="Введите текст поста",)
     pub_date = models.DateTimeField("date published", auto_now_add=True)
+    # Меняется при правке поста и при добавлении и удалении комментариев;
+    # по нему проверяются условные GET-запросы.
+    updated = models.DateTimeField("date updated", auto_now=True)
+    # Индексы по author и group — первые столбцы составных индексов
+    # из Meta.indexes, отдельные индексы по внешним ключам не нужны.
     author = models.ForeignKey(User, on_delete=models.CASCADE,
-                               related_name="posts")
+                               related_name="posts", db_index=False)
     group = models.ForeignKey(Group, models.SET_NULL, blank=True, null=True,
-                              related_name="posts",)
+                              related_name="posts", db_index=False)
     image = models.ImageField(upload_to="posts/", blank=True, null=True)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ("-pub_date",)
+        indexes = (
+            models.Index(fields=("-pub_date", "-id"),
+                         name="post_pub_date"),
+            models.Index(fields=("author", "-pub_date"),
+                         name="post_author_pub_date"),
+            models.Index(fields=("group", "-pub_date"),
+                         name="post_group_pub_date"),
+        )
 
     def __str__(self):
         return textwrap.shorten(self.text, width=15)  # , self.author
@@ -47,7 +68,7 @@ class Post(models.Model):
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE,
-                             related_name="comments")
+                             related_name="comments", db_index=False)
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name="comments")
     text = models.TextField(verbose_name="Текст комментария",
@@ -56,7 +77,11 @@ class Comment(models.Model):
     created = models.DateTimeField("datetime published", auto_now_add=True)
 
     class Meta:
-        ordering = ("-created",)
+        ordering = ("-created", "-id")
+        indexes = (
+            models.Index(fields=("post", "-created", "-id"),
+                         name="comment_post_created"),
+        )
 
     def __str__(self):
         return f"{self.author} commented: {self.text}"
@@ -66,7 +91,7 @@ class Follow(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE,
                              related_name="follower")
     author = models.ForeignKey(User, on_delete=models.CASCADE,
-                               related_name="following")
+                               related_name="following", db_index=False)
     created = models.DateTimeField("datetime started following",
                                    auto_now_add=True, db_index=True)
 
@@ -74,12 +99,111 @@ class Follow(models.Model):
         constraints = (
             models.UniqueConstraint(fields=("user", "author",),
                                     name="User cant follow someone twice"),)
+        indexes = (
+            models.Index(fields=("author", "user"),
+                         name="follow_author_user"),
+            # Списки подписчиков и подписок с курсорами по (created, id).
+            models.Index(fields=("author", "-created", "-id"),
+                         name="follow_author_created"),
+            models.Index(fields=("user", "-created", "-id"),
+                         name="follow_user_created"),
+        )
         ordering = ("-created",)
 
     def __str__(self):
         return f"{self.user} follows {self.author}"
 
 
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="timeline")
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="timeline_entries")
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name="+")
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=("user", "post",),
+                                    name="Post is in timeline once"),)
+        indexes = (
+            models.Index(fields=("user", "-pub_date", "-post"),
+                         name="timeline_user_pub_date"),
+            models.Index(fields=("user", "author"),
+                         name="timeline_user_author"),
+        )
+        ordering = ("-pub_date",)
+
+    def __str__(self):
+        return f"{self.post} in {self.user} timeline"
+
+
+class SearchTerm(models.Model):
+    TERM_LENGTH = 64
+
+    term = models.CharField(max_length=TERM_LENGTH)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name="+")
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE,
+                                blank=True, null=True, related_name="+")
+    weight = models.FloatField()
+
+    class Meta:
+        indexes = (
+            models.Index(fields=("term", "post"), name="search_term_post"),
+        )
+
+    def __str__(self):
+        return f"{self.term} in {self.post_id}"
+
+
+class FollowSuggestion(models.Model):
+    """Кого пользователю стоит читать. Пересчитывается командой
+    compute_follow_suggestions."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name="follow_suggestions",
+                             db_index=False)
+    author = models.ForeignKey(User, on_delete=models.CASCADE,
+                               related_name="+")
+    # Сколько авторов, на которых подписан user, подписаны на author.
+    score = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(fields=("user", "author",),
+                                    name="Author is suggested once"),)
+        indexes = (
+            models.Index(fields=("user", "-score", "author"),
+                         name="suggestion_user_score"),
+        )
+        ordering = ("-score", "author")
+
+    def __str__(self):
+        return f"{self.author} for {self.user}"
+
+
+class UserStats(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name="stats")
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Посты популярного автора не раскладываются по лентам, а читаются
+    # напрямую (posts.timeline).
+    celebrity = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.user} stats"
+
+    @classmethod
+    def for_user(cls, user):
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls.objects.get_or_create(user=user)[0]
+
+
 # class UserProfile(models.Model):
 #     # for user in User.objects.all():
 #     # UserProfile.objects.get_or_create(user=user)
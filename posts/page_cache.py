@@ -0,0 +1,122 @@
+"""Кэш целых страниц для анонимных читателей.
+
+Представления помечают страницу тегами (tag, tag_page): пост, автор,
+группа, лента. Вместе с ответом сохраняются версии его тегов; версии
+хранятся так же, как версии областей фрагментного кэша (feed_cache).
+Сигналы увеличивают версии тегов изменённых объектов (purge), и
+страница с устаревшей версией хотя бы одного тега больше не отдаётся.
+Теги страницы известны только после рендеринга, поэтому purge ещё и
+увеличивает общий счётчик PURGES: если он изменился, пока страница
+рендерилась, она могла собраться из данных до правки, и её не сохраняют.
+Теги уходят и в заголовке Surrogate-Key для обратного прокси.
+
+Кэшируются только успешные GET- и HEAD-ответы анонимам, не выдающие
+CSRF-cookie. Включается настройкой PAGE_CACHE_ENABLED.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from . import feed_cache
+
+INDEX = "feed:index"
+PURGES = "page_cache:purges"
+STORED_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Vary",
+                  "Surrogate-Key")
+
+
+def post_tag(post_id):
+    return f"post:{post_id}"
+
+
+def author_tag(user_id):
+    return f"author:{user_id}"
+
+
+def group_tag(group_id):
+    return f"group:{group_id}"
+
+
+def page_key(request):
+    digest = hashlib.md5(
+        request.build_absolute_uri().encode()).hexdigest()
+    return f"page:{digest}"
+
+
+def is_cacheable(request):
+    return getattr(request, "_page_cache_tags", None) is not None
+
+
+def tag(request, *tags):
+    if is_cacheable(request):
+        request._page_cache_tags.update(tags)
+
+
+def tag_page(request, page, *tags):
+    """Помечает страницу ленты тегами её постов, их авторов и групп.
+    Для некэшируемых запросов посты не загружаются заранее."""
+    if not is_cacheable(request):
+        return
+    tag(request, *tags)
+    for post in page.object_list:
+        tag(request, post_tag(post.pk), author_tag(post.author_id))
+        if post.group_id:
+            tag(request, group_tag(post.group_id))
+
+
+def purge(*tags):
+    for name in tags:
+        feed_cache.bump(name)
+    feed_cache.bump(PURGES)
+
+
+class AnonymousPageCacheMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if (not settings.PAGE_CACHE_ENABLED
+                or request.method not in ("GET", "HEAD")
+                or request.user.is_authenticated):
+            return self.get_response(request)
+        key = page_key(request)
+        entry = cache.get(key)
+        if entry is not None and self.is_fresh(entry):
+            return self.cached_response(request, entry)
+
+        purges, = feed_cache.get_versions(PURGES)
+        request._page_cache_tags = set()
+        response = self.get_response(request)
+        tags = sorted(request._page_cache_tags)
+        if not tags:
+            return response
+        current, *versions = feed_cache.get_versions(PURGES, *tags)
+        if (current == purges and response.status_code == 200
+                and not response.streaming
+                and not request.META.get("CSRF_COOKIE_USED")
+                and not response.cookies):
+            response["Surrogate-Key"] = " ".join(tags)
+            cache.set(key, {
+                "tags": tags,
+                "versions": versions,
+                "content": response.content,
+                "headers": {name: response[name] for name in STORED_HEADERS
+                            if response.has_header(name)},
+            }, settings.PAGE_CACHE_TIMEOUT)
+            response["X-Page-Cache"] = "MISS"
+        return response
+
+    def is_fresh(self, entry):
+        return feed_cache.get_versions(*entry["tags"]) == entry["versions"]
+
+    def cached_response(self, request, entry):
+        headers = entry["headers"]
+        response = HttpResponse(entry["content"])
+        for name, value in headers.items():
+            response[name] = value
+        response["X-Page-Cache"] = "HIT"
+        return get_conditional_response(
+            request, etag=headers.get("ETag"), response=response)
@@ -0,0 +1,153 @@
+import base64
+import binascii
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def elided_page_range(page, on_each_side=3, on_ends=1):
+    """Номера страниц вокруг текущей и по краям, пропуски — None.
+    Так же работает Paginator.get_elided_page_range из Django 3.2."""
+    if getattr(page, "is_cursor", False):
+        return []
+    num_pages = page.paginator.num_pages
+    number = page.number
+    if num_pages <= (on_each_side + on_ends) * 2:
+        return list(range(1, num_pages + 1))
+    pages = []
+    if number > on_each_side + on_ends + 2:
+        pages.extend(range(1, on_ends + 1))
+        pages.append(None)
+        pages.extend(range(number - on_each_side, number + 1))
+    else:
+        pages.extend(range(1, number + 1))
+    if number < num_pages - on_each_side - on_ends - 1:
+        pages.extend(range(number + 1, number + on_each_side + 1))
+        pages.append(None)
+        pages.extend(range(num_pages - on_ends + 1, num_pages + 1))
+    else:
+        pages.extend(range(number + 1, num_pages + 1))
+    return pages
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(value, pk):
+    raw = f"{value.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        value, pk = raw.rsplit("|", 1)
+        value = parse_datetime(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        raise InvalidCursor(token)
+    if value is None:
+        raise InvalidCursor(token)
+    return value, pk
+
+
+class CursorPage:
+    """Страница ленты без номеров: ссылки строятся по курсорам
+    before/after, поэтому ни COUNT, ни OFFSET не нужны."""
+
+    is_cursor = True
+    number = None
+
+    def __init__(self, object_list, paginator, previous_cursor=None,
+                 next_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def __repr__(self):
+        return f"<CursorPage {self.previous_cursor}:{self.next_cursor}>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_previous() or self.has_next()
+
+    def next_page_query(self):
+        return f"before={self.next_cursor}"
+
+    def previous_page_query(self):
+        return f"after={self.previous_cursor}"
+
+
+class CursorPaginator:
+    """Keyset-пагинация по паре (field, pk) в порядке убывания."""
+
+    page_range = range(0)
+
+    def __init__(self, object_list, per_page, field="pub_date"):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        self.field = field
+
+    def _cursor(self, obj):
+        return encode_cursor(getattr(obj, self.field), obj.pk)
+
+    def _filter(self, queryset, token, lookup):
+        value, pk = decode_cursor(token)
+        return queryset.filter(
+            Q(**{f"{self.field}__{lookup}": value})
+            | Q(**{self.field: value, f"pk__{lookup}": pk})
+        )
+
+    def page(self, before=None, after=None):
+        queryset = self.object_list
+        descending = (f"-{self.field}", "-pk")
+        ascending = (self.field, "pk")
+        if after:
+            queryset = self._filter(queryset, after, "gt")
+            items = list(queryset.order_by(*ascending)[:self.per_page + 1])
+            has_more = len(items) > self.per_page
+            items = items[:self.per_page][::-1]
+            has_newer, has_older = has_more, True
+        else:
+            if before:
+                queryset = self._filter(queryset, before, "lt")
+            items = list(queryset.order_by(*descending)[:self.per_page + 1])
+            has_older = len(items) > self.per_page
+            items = items[:self.per_page]
+            has_newer = bool(before)
+        return CursorPage(
+            items,
+            self,
+            previous_cursor=(
+                self._cursor(items[0]) if has_newer and items else None),
+            next_cursor=(
+                self._cursor(items[-1]) if has_older and items else None),
+        )
+
+    def get_page(self, before=None, after=None):
+        """Как Paginator.get_page: битый курсор ведёт на первую
+        страницу вместо ошибки."""
+        try:
+            return self.page(before=before, after=after)
+        except InvalidCursor:
+            return self.page()
@@ -0,0 +1,288 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Тексты разбиваются на слова и приводятся к основам стеммером Портера
+для русского языка, после чего попадают в инвертированный индекс:
+в виртуальную таблицу SQLite FTS5, если она доступна, иначе в таблицу
+SearchTerm. Индекс обновляется сигналами при сохранении и удалении
+постов и комментариев.
+"""
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.db.models import Count, Sum
+
+from .models import Comment, Post, SearchTerm
+
+FTS_TABLE = "posts_search_fts"
+
+TITLE_WEIGHT = 3.0
+TEXT_WEIGHT = 1.0
+COMMENT_WEIGHT = 0.5
+
+WORD_RE = re.compile(r"\w+")
+CYRILLIC_RE = re.compile(r"^[а-я]+$")
+STOP_WORDS = frozenset("""
+    а без более бы был была были было быть в вам вас весь во вот все всего
+    всех вы где да даже для до его ее ей ему если есть еще же за здесь и из
+    или им их к как ко когда кто ли либо мне может мы на надо наш не него
+    нее нет ни них но ну о об однако он она они оно от очень по под при с
+    со так также такой там те тем то того тоже той только том ты у уже
+    хотя чего чей чем что чтобы чье чья эта эти это я
+""".split())
+
+VOWELS = "аеиоуыэюя"
+PERFECTIVE_GERUND = (
+    ("в", "вши", "вшись"),
+    ("ив", "ивши", "ившись", "ыв", "ывши", "ывшись"),
+)
+ADJECTIVE = (
+    "ее", "ие", "ые", "ое", "ими", "ыми", "ей", "ий", "ый", "ой", "ем",
+    "им", "ым", "ом", "его", "ого", "ему", "ому", "их", "ых", "ую", "юю",
+    "ая", "яя", "ою", "ею",
+)
+PARTICIPLE = (
+    ("ем", "нн", "вш", "ющ", "щ"),
+    ("ивш", "ывш", "ующ"),
+)
+REFLEXIVE = ("ся", "сь")
+VERB = (
+    ("ла", "на", "ете", "йте", "ли", "й", "л", "ем", "н", "ло", "но", "ет",
+     "ют", "ны", "ть", "ешь", "нно"),
+    ("ила", "ыла", "ена", "ейте", "уйте", "ите", "или", "ыли", "ей", "уй",
+     "ил", "ыл", "им", "ым", "ен", "ило", "ыло", "ено", "ят", "ует", "уют",
+     "ит", "ыт", "ены", "ить", "ыть", "ишь", "ую", "ю"),
+)
+NOUN = (
+    "а", "ев", "ов", "ие", "ье", "е", "иями", "ями", "ами", "еи", "ии", "и",
+    "ией", "ей", "ой", "ий", "й", "иям", "ям", "ием", "ем", "ам", "ом", "о",
+    "у", "ах", "иях", "ях", "ы", "ь", "ию", "ью", "ю", "ия", "ья", "я",
+)
+SUPERLATIVE = ("ейше", "ейш")
+DERIVATIONAL = ("ость", "ост")
+
+
+def _regions(word):
+    rv = r1 = r2 = len(word)
+    for i, char in enumerate(word):
+        if char in VOWELS:
+            rv = i + 1
+            break
+    for i in range(1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r1 = i + 1
+            break
+    for i in range(r1 + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            r2 = i + 1
+            break
+    return rv, r2
+
+
+def _remove(word, start, endings, after_a=False):
+    """Отрезает самое длинное окончание из endings, лежащее в word[start:].
+    Для окончаний первой группы (after_a) перед ними должна стоять
+    «а» или «я», которые не удаляются."""
+    for ending in sorted(endings, key=len, reverse=True):
+        if word.endswith(ending) and len(word) - len(ending) >= start:
+            if not after_a:
+                return word[:-len(ending)]
+            head = word[:-len(ending)]
+            if len(head) > start and head[-1] in "ая":
+                return head
+            return None
+    return None
+
+
+def _remove_grouped(word, start, groups):
+    first, second = groups
+    candidates = [(ending, True) for ending in first]
+    candidates += [(ending, False) for ending in second]
+    for ending, after_a in sorted(candidates, key=lambda c: -len(c[0])):
+        if word.endswith(ending) and len(word) - len(ending) >= start:
+            return _remove(word, start, (ending,), after_a)
+    return None
+
+
+def stem(word):
+    """Стеммер Snowball (Портер) для русского языка."""
+    word = word.replace("ё", "е")
+    if not CYRILLIC_RE.match(word):
+        return word
+    rv, r2 = _regions(word)
+
+    result = _remove_grouped(word, rv, PERFECTIVE_GERUND)
+    if result is None:
+        word = _remove(word, rv, REFLEXIVE) or word
+        result = _remove(word, rv, ADJECTIVE)
+        if result is not None:
+            result = _remove_grouped(result, rv, PARTICIPLE) or result
+        else:
+            result = (_remove_grouped(word, rv, VERB)
+                      or _remove(word, rv, NOUN))
+    word = result if result is not None else word
+
+    word = _remove(word, rv, ("и",)) or word
+    word = _remove(word, max(r2, rv), DERIVATIONAL) or word
+
+    if word.endswith("нн") and len(word) - 2 >= rv:
+        word = word[:-1]
+    else:
+        shorter = _remove(word, rv, SUPERLATIVE)
+        if shorter is not None:
+            word = shorter
+            if word.endswith("нн"):
+                word = word[:-1]
+        elif word.endswith("ь") and len(word) - 1 >= rv:
+            word = word[:-1]
+    return word
+
+
+def tokenize(text):
+    words = WORD_RE.findall((text or "").lower().replace("ё", "е"))
+    return [stem(word) for word in words
+            if word not in STOP_WORDS and not word.startswith("_")]
+
+
+class FTS5Backend:
+    """Строки таблицы: rowid = id поста для самого поста и
+    -id комментария для комментариев."""
+
+    name = "fts5"
+
+    def _execute(self, sql, params=()):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def _write(self, rowid, post_id, title, body):
+        self._execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [rowid])
+        self._execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, post_id, title, body) "
+            f"VALUES (%s, %s, %s, %s)",
+            [rowid, post_id, " ".join(tokenize(title)),
+             " ".join(tokenize(body))])
+
+    def index_post(self, post):
+        self._write(post.pk, post.pk, post.title, post.text)
+
+    def index_comment(self, comment):
+        self._write(-comment.pk, comment.post_id, "", comment.text)
+
+    def remove_post(self, post_id):
+        self._execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                      [post_id])
+
+    def remove_comment(self, comment_id):
+        self._execute(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s",
+                      [-comment_id])
+
+    def clear(self):
+        self._execute(f"DELETE FROM {FTS_TABLE}")
+
+    def search(self, terms, limit):
+        match = " ".join('"{}"'.format(term) for term in terms)
+        # bm25() отрицателен: чем меньше, тем релевантнее. Агрегировать
+        # его SQLite не умеет, поэтому лучший ранг поста берём здесь.
+        found = []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT post_id FROM {FTS_TABLE} "
+                f"WHERE {FTS_TABLE} MATCH %s "
+                f"ORDER BY bm25({FTS_TABLE}, 0, %s, %s) "
+                f"* CASE WHEN rowid < 0 THEN %s ELSE 1 END, post_id DESC",
+                [match, TITLE_WEIGHT, TEXT_WEIGHT, COMMENT_WEIGHT])
+            seen = set()
+            for post_id, in iter(cursor.fetchone, None):
+                if post_id not in seen:
+                    seen.add(post_id)
+                    found.append(post_id)
+                    if len(found) >= limit:
+                        break
+        return found
+
+
+class TermTableBackend:
+    name = "python"
+
+    def _write(self, post_id, comment_id, weighted_texts):
+        SearchTerm.objects.filter(post_id=post_id,
+                                  comment_id=comment_id).delete()
+        weights = Counter()
+        for text, weight in weighted_texts:
+            for term in tokenize(text):
+                weights[term[:SearchTerm.TERM_LENGTH]] += weight
+        SearchTerm.objects.bulk_create(
+            [SearchTerm(term=term, post_id=post_id, comment_id=comment_id,
+                        weight=weight)
+             for term, weight in weights.items()])
+
+    def index_post(self, post):
+        self._write(post.pk, None, ((post.title, TITLE_WEIGHT),
+                                    (post.text, TEXT_WEIGHT)))
+
+    def index_comment(self, comment):
+        self._write(comment.post_id, comment.pk,
+                    ((comment.text, COMMENT_WEIGHT),))
+
+    def remove_post(self, post_id):
+        SearchTerm.objects.filter(post_id=post_id).delete()
+
+    def remove_comment(self, comment_id):
+        SearchTerm.objects.filter(comment_id=comment_id).delete()
+
+    def clear(self):
+        SearchTerm.objects.all().delete()
+
+    def search(self, terms, limit):
+        terms = {term[:SearchTerm.TERM_LENGTH] for term in terms}
+        matches = (SearchTerm.objects.filter(term__in=terms)
+                   .values("post_id")
+                   .annotate(score=Sum("weight"),
+                             matched=Count("term", distinct=True))
+                   .filter(matched=len(terms))
+                   .order_by("-score", "-post_id")[:limit])
+        return [match["post_id"] for match in matches]
+
+
+_backend = None
+
+
+def fts5_available():
+    if connection.vendor != "sqlite":
+        return False
+    try:
+        rows = FTS5Backend()._execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' "
+            "AND name = %s", [FTS_TABLE])
+    except OperationalError:
+        return False
+    return bool(rows)
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        choice = settings.SEARCH_BACKEND
+        if choice == "auto":
+            choice = "fts5" if fts5_available() else "python"
+        _backend = FTS5Backend() if choice == "fts5" else TermTableBackend()
+    return _backend
+
+
+def search_posts(query, limit=None):
+    """Возвращает id постов по убыванию релевантности."""
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not terms:
+        return []
+    return get_backend().search(terms, limit or settings.SEARCH_MAX_RESULTS)
+
+
+def rebuild_index(backend=None):
+    backend = backend or get_backend()
+    backend.clear()
+    for post in Post.objects.only("pk", "title", "text").iterator():
+        backend.index_post(post)
+    for comment in Comment.objects.only("pk", "post_id", "text").iterator():
+        backend.index_comment(comment)
@@ -0,0 +1,195 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import (feed_cache, follow_graph, page_cache, search, thumbnails,
+               timeline)
+from .models import Comment, Follow, FollowSuggestion, Group, Post, UserStats
+
+
+def change_counter(model, field, delta, touch=None, **lookup):
+    """touch — поле даты, которое заодно выставляется в текущее время."""
+    queryset = model.objects.filter(**lookup)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    changes = {field: F(field) + delta}
+    if touch:
+        changes[touch] = timezone.now()
+    queryset.update(**changes)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(UserStats, "posts_count", 1,
+                       user_id=instance.author_id)
+        timeline.fan_out(instance)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    change_counter(UserStats, "posts_count", -1, user_id=instance.author_id)
+
+
+@receiver(post_save, sender=Comment)
+def comment_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(Post, "comment_count", 1, touch="updated",
+                       pk=instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    change_counter(Post, "comment_count", -1, touch="updated",
+                   pk=instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        change_counter(UserStats, "followers_count", 1,
+                       user_id=instance.author_id)
+        change_counter(UserStats, "following_count", 1,
+                       user_id=instance.user_id)
+        timeline.followed(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+        FollowSuggestion.objects.filter(
+            user_id=instance.user_id, author_id=instance.author_id).delete()
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    change_counter(UserStats, "followers_count", -1,
+                   user_id=instance.author_id)
+    change_counter(UserStats, "following_count", -1,
+                   user_id=instance.user_id)
+    timeline.trim(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_posts_version(sender, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump(feed_cache.POSTS)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_groups_version(sender, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump(feed_cache.GROUPS)
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_version(sender, instance, raw=False, **kwargs):
+    if not raw:
+        feed_cache.bump(feed_cache.follow_scope(instance.user_id))
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.get_backend().index_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove_post(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.get_backend().index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    search.get_backend().remove_comment(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def schedule_thumbnail(sender, instance, raw=False, **kwargs):
+    if not raw and instance.image:
+        name, post_id = instance.image.name, instance.pk
+        transaction.on_commit(lambda: thumbnails.schedule(name, post_id))
+
+
+@receiver(pre_save, sender=Post)
+def remember_post_group(sender, instance, raw=False, **kwargs):
+    """При переносе поста в другую группу страница старой группы тоже
+    устаревает."""
+    instance._previous_group_id = None
+    if instance.pk and not raw:
+        instance._previous_group_id = (
+            Post.objects.filter(pk=instance.pk)
+            .values_list("group_id", flat=True).first())
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def purge_post_pages(sender, instance, created=True, raw=False, **kwargs):
+    if raw:
+        return
+    tags = {page_cache.post_tag(instance.pk),
+            page_cache.author_tag(instance.author_id)}
+    for group_id in (instance.group_id,
+                     getattr(instance, "_previous_group_id", None)):
+        if group_id:
+            tags.add(page_cache.group_tag(group_id))
+    if created:
+        tags.add(page_cache.INDEX)
+    page_cache.purge(*tags)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def purge_comment_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.purge(page_cache.post_tag(instance.post_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def purge_group_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        page_cache.purge(page_cache.group_tag(instance.pk))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def purge_follow_pages(sender, instance, raw=False, **kwargs):
+    # Счётчики подписчиков и подписок видны в профиле и на странице поста.
+    if not raw:
+        page_cache.purge(page_cache.author_tag(instance.author_id),
+                         page_cache.author_tag(instance.user_id))
+
+
+@receiver(post_save, sender=Follow)
+def add_to_follow_graph(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and settings.FOLLOW_GRAPH_ENABLED:
+        user_id, author_id = instance.user_id, instance.author_id
+        transaction.on_commit(
+            lambda: follow_graph.follow_changed(user_id, author_id, True))
+
+
+@receiver(post_delete, sender=Follow)
+def remove_from_follow_graph(sender, instance, **kwargs):
+    if settings.FOLLOW_GRAPH_ENABLED:
+        user_id, author_id = instance.user_id, instance.author_id
+        transaction.on_commit(
+            lambda: follow_graph.follow_changed(user_id, author_id, False))
@@ -0,0 +1,33 @@
+"""Тег {% cache %} с пересчётом промаха через cache.get_or_set.
+
+Синтаксис тот же, что у django.templatetags.cache, но одновременные
+запросы к истёкшему фрагменту ждут один рендеринг, а не рендерят его
+каждый сам.
+"""
+from django import template
+from django.core.cache import caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags import cache as cache_tags
+
+register = template.Library()
+
+
+class SingleFlightCacheNode(cache_tags.CacheNode):
+    def render(self, context):
+        expire_time = self.expire_time_var.resolve(context)
+        if expire_time is not None:
+            expire_time = int(expire_time)
+        fragment_cache = caches[self.cache_name.resolve(context)
+                                if self.cache_name else "default"]
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return fragment_cache.get_or_set(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context), expire_time)
+
+
+@register.tag("cache")
+def do_cache(parser, token):
+    node = cache_tags.do_cache(parser, token)
+    return SingleFlightCacheNode(node.nodelist, node.expire_time_var,
+                                 node.fragment_name, node.vary_on,
+                                 node.cache_name)
@@ -0,0 +1,41 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from posts import benchmark
+from posts.models import Comment, Follow, Post
+
+
+class BenchmarkTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_dataset_and_run(self):
+        """Набор данных строится, а все маршруты отвечают и измеряются."""
+        dataset = benchmark.build_dataset(users=20, groups=2, posts=100,
+                                          comments=50, follows=5)
+        self.assertEqual(Post.objects.count(), 100)
+        self.assertEqual(Comment.objects.count(), 50)
+        self.assertEqual(Follow.objects.count(), dataset['follows'])
+        self.assertGreater(
+            Post.objects.values('pub_date').distinct().count(), 1)
+        results = benchmark.run(iterations=2)
+        self.assertEqual(tuple(results), benchmark.ROUTES)
+        for route, row in results.items():
+            with self.subTest(route=route):
+                self.assertEqual(row['requests'], 2)
+                self.assertGreater(row['queries'], 0)
+                self.assertLessEqual(row['p50'], row['p99'])
+
+
+class CompareTest(SimpleTestCase):
+    def test_regressions_over_threshold(self):
+        """Ухудшение p95 или числа запросов больше порога попадает
+        в список регрессий."""
+        baseline = {'index': {'p95': 10.0, 'queries': 4, 'bytes': 100}}
+        results = {'index': {'p95': 12.0, 'queries': 4, 'bytes': 150},
+                   'profile': {'p95': 1.0, 'queries': 1, 'bytes': 1}}
+        rows, regressions = benchmark.compare(results, baseline, 0.1)
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([row[:2] for row in regressions],
+                         [('index', 'p95')])
+        self.assertAlmostEqual(regressions[0][4], 0.2)
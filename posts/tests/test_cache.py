@@ -0,0 +1,97 @@
+import threading
+import time
+
+from django.core.cache import caches
+from django.test import SimpleTestCase
+
+from yatube.cache import MISSING, LRUStore, TieredCache
+
+
+class LRUStoreTest(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        """При переполнении вытесняется давно не читавшаяся запись."""
+        store = LRUStore(max_entries=2, max_bytes=1024)
+        store.set('a', 1, None)
+        store.set('b', 2, None)
+        store.get('a')
+        self.assertEqual(store.set('c', 3, None), 1)
+        self.assertEqual(store.get('a'), 1)
+        self.assertEqual(store.get('c'), 3)
+        self.assertFalse(store.delete('b'))
+
+    def test_memory_is_bounded(self):
+        """Суммарный размер записей не превышает max_bytes."""
+        store = LRUStore(max_entries=1000, max_bytes=1000)
+        for i in range(100):
+            store.set(i, 'x' * 100, None)
+        self.assertLessEqual(store.size, 1000)
+        store.set('huge', 'x' * 2000, None)
+        self.assertIs(store.get('huge'), MISSING)
+        self.assertLessEqual(store.size, 1000)
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.shared = caches['shared']
+        self.shared.clear()
+        self.cache = TieredCache('shared', {'OPTIONS': {
+            'L1_TIMEOUT': 60,
+            'L1_BYPASS': ('version:',),
+            'TIMEOUTS': {'short:': 1},
+            'LOCK_TIMEOUT': 5,
+        }})
+
+    def test_l1_serves_values_written_to_l2(self):
+        """Значение из L2 копируется в L1 и дальше читается оттуда."""
+        self.shared.set('key', 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertEqual(self.cache.get('key'), 'value')
+        self.assertIsNone(self.cache.get('other'))
+        stats = self.cache.get_stats()
+        self.assertEqual(stats['l2_hits'], 1)
+        self.assertEqual(stats['l1_hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_bypass_prefix_always_reads_l2(self):
+        """Ключи из L1_BYPASS не кэшируются в памяти процесса."""
+        self.cache.set('version:posts', 1)
+        self.shared.incr('version:posts')
+        self.assertEqual(self.cache.get('version:posts'), 2)
+        self.assertEqual(self.cache.incr('version:posts'), 3)
+
+    def test_prefix_timeout(self):
+        """TIMEOUTS задаёт время жизни по префиксу ключа."""
+        self.cache.set('short:key', 'value')
+        self.cache.set('long:key', 'value')
+        time.sleep(1.1)
+        self.assertIsNone(self.cache.get('short:key'))
+        self.assertEqual(self.cache.get('long:key'), 'value')
+
+    def test_delete_clears_both_tiers(self):
+        """delete удаляет значение из обоих уровней."""
+        self.cache.set('key', 'value')
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertIsNone(self.shared.get('key'))
+
+    def test_get_or_set_computes_once(self):
+        """Одновременные промахи пересчитывают значение один раз."""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(
+                self.cache.get_or_set('hot', compute)))
+            for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['value'] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.get_stats()['recomputes'], 1)
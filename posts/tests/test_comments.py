@@ -0,0 +1,85 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+@override_settings(COMMENTS_PER_PAGE=5, COMMENTS_MAX_PER_PAGE=8)
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.post = Post.objects.create(text='Тестовый текст',
+                                       author=cls.author)
+        cls.COMMENTS_COUNT = 12
+        for i in range(cls.COMMENTS_COUNT):
+            commenter = User.objects.create_user(username=f'commenter{i}')
+            Comment.objects.create(text=f'Комментарий {i}',
+                                   author=commenter, post=cls.post)
+        cls.ordered = list(cls.post.comments.order_by('-created', '-pk'))
+        cls.post_url = reverse('post', args=['test_author', cls.post.pk])
+        cls.more_url = reverse('post_comments',
+                               args=['test_author', cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_post_page_shows_first_comments(self):
+        """На странице поста только первая порция комментариев,
+        и это QuerySet."""
+        response = self.client.get(self.post_url)
+        comments = response.context['comments']
+        self.assertIsInstance(comments, QuerySet)
+        self.assertEqual(list(comments), self.ordered[:5])
+        self.assertContains(response, self.more_url)
+
+    def test_limit_is_capped(self):
+        """Размер порции не превышает COMMENTS_MAX_PER_PAGE."""
+        response = self.client.get(self.post_url, {'limit': 1000})
+        self.assertEqual(len(response.context['comments']), 8)
+
+    def test_load_more_walks_all_comments(self):
+        """По курсорам «Показать ещё» комментарии выдаются по порядку
+        и без повторов."""
+        response = self.client.get(self.post_url)
+        seen = list(response.context['comments'])
+        cursor = response.context['next_cursor']
+        while cursor:
+            response = self.client.get(self.more_url, {'before': cursor})
+            self.assertNotContains(response, '<html')
+            seen.extend(response.context['comments'])
+            cursor = response.context['next_cursor']
+        self.assertEqual(seen, self.ordered)
+        self.assertNotContains(response, self.more_url)
+
+    def test_comment_authors_are_joined(self):
+        """Авторы комментариев загружаются тем же запросом."""
+        for url in (self.post_url, self.more_url):
+            with self.subTest(url=url):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                comment_queries = [
+                    query['sql'] for query in queries.captured_queries
+                    if 'posts_comment' in query['sql']]
+                self.assertEqual(len(comment_queries), 1)
+
+    def test_no_more_link_for_short_thread(self):
+        """Если комментариев меньше порции, кнопки «Показать ещё» нет."""
+        post = Post.objects.create(text='Другой пост', author=self.author)
+        Comment.objects.create(text='Комментарий', author=self.author,
+                               post=post)
+        response = self.client.get(
+            reverse('post', args=['test_author', post.pk]))
+        self.assertIsNone(response.context['next_cursor'])
+        self.assertNotContains(
+            response, reverse('post_comments', args=['test_author', post.pk]))
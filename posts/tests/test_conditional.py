@@ -0,0 +1,97 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='test_author')
+        self.reader = User.objects.create_user(username='test_reader')
+        self.group = Group.objects.create(title='Тестовая группа',
+                                          slug='test-slug',
+                                          description='Описание')
+        self.post = Post.objects.create(text='Тестовый текст',
+                                        author=self.author,
+                                        group=self.group)
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.urls = {
+            'post': reverse('post', args=['test_author', self.post.pk]),
+            'profile': reverse('profile', args=['test_author']),
+            'group': reverse('group', args=['test-slug']),
+        }
+
+    def revalidate(self, client, url, etag):
+        return client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_page_is_not_rendered(self):
+        """Повторный запрос неизменённой страницы получает 304 без
+        рендеринга шаблона."""
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                # Первый ответ выдаёт CSRF-cookie, от которой зависит ETag.
+                self.reader_client.get(url)
+                response = self.reader_client.get(url)
+                self.assertIn('Cookie', response['Vary'])
+                again = self.revalidate(self.reader_client, url,
+                                        response['ETag'])
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again.templates, [])
+
+    def test_changes_invalidate_etag(self):
+        """Новый комментарий, новый пост и смена подписки меняют ETag."""
+        self.reader_client.get(self.urls['post'])
+        etags = {name: self.reader_client.get(url)['ETag']
+                 for name, url in self.urls.items()}
+        Comment.objects.create(text='Комментарий', author=self.reader,
+                               post=self.post)
+        Post.objects.create(text='Ещё пост', author=self.author,
+                            group=self.group)
+        for name, url in self.urls.items():
+            with self.subTest(page=name):
+                response = self.revalidate(self.reader_client, url,
+                                           etags[name])
+                self.assertEqual(response.status_code, 200)
+
+        url = self.urls['profile']
+        etag = self.reader_client.get(url)['ETag']
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            self.revalidate(self.reader_client, url, etag).status_code, 200)
+
+    def test_etag_depends_on_user(self):
+        """ETag одного пользователя не подходит другому."""
+        url = self.urls['post']
+        etag = self.reader_client.get(url)['ETag']
+        self.assertEqual(self.revalidate(Client(), url, etag).status_code,
+                         200)
+
+    def test_group_rename_invalidates_etag(self):
+        """Переименование группы меняет ETag страниц поста и профиля,
+        где видно её название."""
+        self.reader_client.get(self.urls['post'])
+        etags = {name: self.reader_client.get(self.urls[name])['ETag']
+                 for name in ('post', 'profile')}
+        self.group.title = 'Новое название'
+        self.group.save()
+        for name, etag in etags.items():
+            with self.subTest(page=name):
+                response = self.revalidate(self.reader_client,
+                                           self.urls[name], etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_no_last_modified(self):
+        """Last-Modified не отдаётся: время правки поста не учитывает
+        счётчики и подписки, и If-Modified-Since не даёт 304."""
+        url = self.urls['post']
+        response = Client().get(url)
+        self.assertFalse(response.has_header('Last-Modified'))
+        response = Client().get(
+            url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
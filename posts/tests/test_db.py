@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError
+from django.db.utils import ConnectionHandler
+from django.test import Client, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+from yatube.db import retry_on_locked
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x01\x00\x01\x00\x00\x00\x00\x21'
+    b'\xf9\x04\x01\x00\x00\x00\x00\x2c\x00\x00\x00\x00\x01\x00'
+    b'\x01\x00\x00\x02\x01\x00\x00\x3b'
+)
+
+
+class ProductionBackendTest(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+
+    def test_pragmas_applied_to_new_connection(self):
+        """PRAGMA из OPTIONS выполняются на каждом новом соединении."""
+        handler = ConnectionHandler({'default': {
+            'ENGINE': 'yatube.backends.sqlite3',
+            'NAME': os.path.join(self.directory, 'db.sqlite3'),
+            'OPTIONS': {'timeout': 1, 'PRAGMAS': {
+                'journal_mode': 'wal',
+                'synchronous': 'normal',
+                'busy_timeout': 1234,
+            }},
+        }})
+        connection = handler['default']
+        self.addCleanup(connection.close)
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], 1234)
+
+
+@override_settings(DB_LOCK_RETRIES=2, DB_LOCK_RETRY_DELAY=0)
+class RetryOnLockedTest(TransactionTestCase):
+    def test_locked_write_is_retried_in_fresh_transaction(self):
+        """Запись, упавшая на блокировке, откатывается и повторяется."""
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            Group.objects.create(title=f'Группа {len(calls)}',
+                                 slug=f'group-{len(calls)}')
+            if len(calls) < 3:
+                raise OperationalError('database is locked')
+            return 'ok'
+
+        self.assertEqual(write(), 'ok')
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(list(Group.objects.values_list('slug', flat=True)),
+                         ['group-3'])
+
+    def test_gives_up_after_retries(self):
+        """После DB_LOCK_RETRIES повторов ошибка пробрасывается."""
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            raise OperationalError('database is locked')
+
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        """Другие ошибки базы не повторяются."""
+        calls = []
+
+        @retry_on_locked
+        def write():
+            calls.append(1)
+            raise OperationalError('no such table')
+
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(DB_LOCK_RETRIES=2, DB_LOCK_RETRY_DELAY=0)
+class NewPostRetryTest(TransactionTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        self.media_root = media_root
+        self.client = Client()
+        self.client.force_login(User.objects.create_user(username='writer'))
+
+    def test_retry_does_not_store_image_twice(self):
+        """Повтор записи поста не сохраняет загруженный файл ещё раз."""
+        original_save = Post.save
+        calls = []
+
+        def save(post, *args, **kwargs):
+            calls.append(1)
+            original_save(post, *args, **kwargs)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+
+        upload = SimpleUploadedFile('small.gif', SMALL_GIF,
+                                    content_type='image/gif')
+        with mock.patch.object(Post, 'save', autospec=True,
+                               side_effect=save), \
+                mock.patch('posts.signals.thumbnails.schedule'):
+            response = self.client.post(reverse('new_post'), {
+                'title': 'Заголовок', 'text': 'Текст', 'image': upload})
+
+        self.assertRedirects(response, reverse('index'),
+                             fetch_redirect_response=False)
+        self.assertEqual(len(calls), 2)
+        post = Post.objects.get()
+        self.assertEqual(os.listdir(os.path.join(self.media_root, 'posts')),
+                         [os.path.basename(post.image.name)])
@@ -0,0 +1,183 @@
+import random
+import threading
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import (Client, SimpleTestCase, TransactionTestCase,
+                         override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import benchmark, feed_cache, follow_graph, follows
+from posts.follow_graph import FollowGraph
+from posts.models import Follow
+
+User = get_user_model()
+
+
+@override_settings(FOLLOW_GRAPH_DELTA_LIMIT=7)
+class FollowGraphTest(SimpleTestCase):
+    def test_matches_set_of_pairs(self):
+        """После случайных подписок и отписок (со слиянием дельты) граф
+        совпадает с множеством пар."""
+        rnd = random.Random(0)
+        pairs = {(rnd.randint(1, 30), rnd.randint(1, 30))
+                 for _ in range(200)}
+        graph = FollowGraph(pairs)
+        for _ in range(300):
+            pair = (rnd.randint(1, 30), rnd.randint(1, 30))
+            following = rnd.random() < 0.5
+            graph.apply(*pair, following)
+            if following:
+                pairs.add(pair)
+            else:
+                pairs.discard(pair)
+        for user in range(0, 32):
+            with self.subTest(user=user):
+                authors = sorted(author for follower, author in pairs
+                                 if follower == user)
+                self.assertEqual(list(graph.following_ids(user)), authors)
+                self.assertEqual(graph.following_count(user), len(authors))
+                self.assertEqual(
+                    graph.followers_count(user),
+                    sum(1 for _, author in pairs if author == user))
+                for author in range(0, 32):
+                    self.assertEqual(graph.follows(user, author),
+                                     (user, author) in pairs)
+
+    def test_compaction_runs_in_background(self):
+        """Слияние дельты идёт в фоне: пока оно строит массивы, граф
+        читается и меняется, а изменения за это время не теряются."""
+        pairs = {(1, 2), (2, 3)}
+        graph = FollowGraph(pairs)
+        release = threading.Event()
+        build = follow_graph.Adjacency
+
+        def slow_build(edges):
+            release.wait(5)
+            return build(edges)
+
+        with mock.patch.object(follow_graph, 'Adjacency',
+                               side_effect=slow_build):
+            for author in range(10, 17):
+                graph.apply(1, author, True)
+                pairs.add((1, author))
+            self.assertIsNotNone(graph.compactor)
+            graph.apply(3, 1, True)
+            graph.apply(1, 10, False)
+            pairs |= {(3, 1)}
+            pairs -= {(1, 10)}
+            self.assertTrue(graph.follows(3, 1))
+            self.assertFalse(graph.follows(1, 10))
+            release.set()
+            graph.compactor.join()
+        self.assertEqual(graph.removed, {(1, 10)})
+        self.assertEqual(graph.added, {(3, 1)})
+        for user, author in pairs:
+            self.assertTrue(graph.follows(user, author))
+        self.assertEqual(list(graph.following_ids(1)),
+                         [2, 11, 12, 13, 14, 15, 16])
+
+    def test_footprint_benchmark(self):
+        """На подписку уходит около двух 32-битных чисел."""
+        result = benchmark.follow_graph_footprint(
+            edges=5000, users=500, lookups=100)
+        self.assertEqual(result['edges'], 5000)
+        self.assertLessEqual(result['array_bytes'],
+                             5000 * 8 + (500 + 2) * 8)
+        self.assertLess(result['array_bytes'], result['set_bytes'])
+
+
+@override_settings(FOLLOW_GRAPH_ENABLED=True)
+class ProcessFollowGraphTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        follow_graph.reset()
+        self.addCleanup(follow_graph.reset)
+        self.reader = User.objects.create_user(username='test_reader')
+        self.author = User.objects.create_user(username='test_author')
+
+    def test_signals_update_loaded_graph(self):
+        """Подписка и отписка сразу видны в загруженном графе."""
+        graph = follow_graph.get_graph()
+        follows.follow(self.reader, self.author)
+        self.assertTrue(graph.follows(self.reader.pk, self.author.pk))
+        self.assertEqual(graph.followers_count(self.author.pk), 1)
+        follows.unfollow(self.reader, self.author)
+        self.assertFalse(graph.follows(self.reader.pk, self.author.pk))
+        self.assertIs(follow_graph.get_graph(), graph)
+
+    def test_checks_run_without_queries(self):
+        """Проверка подписки не обращается к базе."""
+        follows.follow(self.reader, self.author)
+        follow_graph.get_graph()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIn(self.author,
+                          follows.FollowedAuthors(self.reader))
+        self.assertEqual(len(queries), 0)
+
+    def test_ajax_follow_returns_new_followers_count(self):
+        """JSON подписки и отписки содержит число подписчиков после
+        изменения, хотя граф обновляется только после фиксации."""
+        follow_graph.get_graph()
+        client = Client()
+        client.force_login(self.reader)
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        response = client.get(
+            reverse('profile_follow', args=['test_author']), **ajax)
+        self.assertEqual(response.json(),
+                         {'following': True, 'followers': 1})
+        response = client.get(
+            reverse('profile_unfollow', args=['test_author']), **ajax)
+        self.assertEqual(response.json(),
+                         {'following': False, 'followers': 0})
+
+    def test_falls_back_to_database_for_user_changed_elsewhere(self):
+        """Пока граф не перезагружен, подписки пользователя, изменённые
+        другим процессом, читаются из базы; для остальных хватает графа."""
+        stranger = User.objects.create_user(username='test_stranger')
+        graph = follow_graph.get_graph()
+        # Другой процесс: запись в базу и общие версии, но не этот граф.
+        Follow.objects.bulk_create([Follow(user=self.reader,
+                                           author=self.author)])
+        version = feed_cache.bump(follow_graph.SCOPE)
+        cache.set(follow_graph.user_key(self.reader.pk), version, None)
+
+        self.assertFalse(graph.follows(self.reader.pk, self.author.pk))
+        self.assertIsNone(follow_graph.graph_for(self.reader.pk))
+        self.assertIn(self.author, follows.FollowedAuthors(self.reader))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertNotIn(self.author, follows.FollowedAuthors(stranger))
+        self.assertEqual(len(queries), 0)
+
+        # Изменение из этого процесса граф учитывает сам.
+        follows.unfollow(self.reader, self.author)
+        self.assertIs(follow_graph.graph_for(self.reader.pk), graph)
+
+    @override_settings(FOLLOW_GRAPH_MAX_STALENESS=0)
+    def test_reloads_after_change_in_other_process(self):
+        """Изменение из другого процесса приводит к перезагрузке в фоне:
+        пока она идёт, запрос получает прежний граф, а подписка, пришедшая
+        во время загрузки, не теряется при замене."""
+        graph = follow_graph.get_graph()
+        self.assertIs(follow_graph.get_graph(), graph)
+        loaded = threading.Event()
+        load = FollowGraph.load
+
+        def slow_load():
+            loaded.wait(5)
+            return load()
+
+        feed_cache.bump(follow_graph.SCOPE)
+        with mock.patch.object(FollowGraph, 'load', side_effect=slow_load):
+            self.assertIs(follow_graph.get_graph(), graph)
+            # Подписка в этом процессе во время загрузки применяется
+            # к прежнему графу и повторяется на новом.
+            follow_graph.follow_changed(self.reader.pk, self.author.pk, True)
+            loaded.set()
+            follow_graph._reload_thread.join()
+        reloaded = follow_graph.get_graph()
+        self.assertIsNot(reloaded, graph)
+        self.assertTrue(reloaded.follows(self.reader.pk, self.author.pk))
@@ -0,0 +1,182 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import follows
+from posts.models import Follow, Post, UserStats
+
+User = get_user_model()
+
+
+class FollowTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='test_reader')
+        cls.author = User.objects.create_user(username='test_author')
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def followers(self):
+        return UserStats.objects.get(user=self.author).followers_count
+
+    def test_repeated_follow_creates_one_subscription(self):
+        """Повторная подписка не падает на уникальном ограничении
+        и не меняет счётчики."""
+        self.assertTrue(follows.follow(self.reader, self.author))
+        self.assertFalse(follows.follow(self.reader, self.author))
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(self.followers(), 1)
+
+    def test_cannot_follow_self(self):
+        """На себя подписаться нельзя."""
+        self.assertFalse(follows.follow(self.author, self.author))
+        self.assertFalse(Follow.objects.exists())
+
+    def test_unfollow_missing_subscription(self):
+        """Отписка без подписки ничего не меняет."""
+        self.assertFalse(follows.unfollow(self.reader, self.author))
+        follows.follow(self.reader, self.author)
+        self.assertTrue(follows.unfollow(self.reader, self.author))
+        self.assertEqual(self.followers(), 0)
+
+    def test_ajax_returns_followers_count(self):
+        """AJAX-запрос подписки возвращает JSON с числом подписчиков."""
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        response = self.client.get(
+            reverse('profile_follow', args=['test_author']), **ajax)
+        self.assertEqual(response.json(),
+                         {'following': True, 'followers': 1})
+        response = self.client.get(
+            reverse('profile_unfollow', args=['test_author']), **ajax)
+        self.assertEqual(response.json(),
+                         {'following': False, 'followers': 0})
+
+    def test_plain_request_redirects_to_profile(self):
+        """Обычный запрос подписки перенаправляет в профиль."""
+        response = self.client.get(
+            reverse('profile_follow', args=['test_author']))
+        self.assertRedirects(response,
+                             reverse('profile', args=['test_author']))
+
+
+class FollowedAuthorsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='test_reader')
+        cls.authors = [User.objects.create_user(username=f'author{i}')
+                       for i in range(10)]
+        for author in cls.authors[::2]:
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(text='Программирование', author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_membership_takes_one_query(self):
+        """Проверка подписки на любое число авторов — один запрос,
+        повторная — из кэша."""
+        followed = follows.FollowedAuthors(self.reader)
+        with CaptureQueriesContext(connection) as queries:
+            result = [author in followed for author in self.authors]
+        self.assertEqual(result, [True, False] * 5)
+        self.assertEqual(len(queries), 1)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIn(self.authors[0].pk,
+                          follows.FollowedAuthors(self.reader))
+        self.assertEqual(len(queries), 0)
+
+    def test_cache_follows_subscriptions(self):
+        """После подписки и отписки кэш не отдаёт старый список."""
+        self.assertNotIn(self.authors[1], follows.FollowedAuthors(self.reader))
+        follows.follow(self.reader, self.authors[1])
+        self.assertIn(self.authors[1], follows.FollowedAuthors(self.reader))
+        follows.unfollow(self.reader, self.authors[0])
+        self.assertNotIn(self.authors[0],
+                         follows.FollowedAuthors(self.reader))
+
+    def test_search_shows_follow_buttons(self):
+        """В результатах поиска у авторов кнопки подписки по состоянию."""
+        client = Client()
+        client.force_login(self.reader)
+        response = client.get(reverse('search'), {'q': 'программирование'})
+        self.assertContains(response, 'btn btn-sm btn-light', count=5)
+        self.assertNotContains(response, 'btn btn-sm btn-primary')
+
+
+@override_settings(FOLLOW_LIST_PER_PAGE=3)
+class FollowListTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.followers = [User.objects.create_user(username=f'follower{i}')
+                         for i in range(7)]
+        for follower in cls.followers:
+            Follow.objects.create(user=follower, author=cls.author)
+        Follow.objects.create(user=cls.author, author=cls.followers[0])
+        cls.url = reverse('followers', args=['test_author'])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.followers[0])
+
+    def walk(self, url):
+        response = self.client.get(url)
+        people = list(response.context['page'])
+        while response.context['page'].has_next():
+            response = self.client.get(
+                url, {'before': response.context['page'].next_cursor})
+            people.extend(response.context['page'])
+        return people
+
+    def test_followers_are_listed_newest_first(self):
+        """Курсоры обходят всех подписчиков, новые — первыми."""
+        self.assertEqual(self.walk(self.url), self.followers[::-1])
+
+    def test_following_page(self):
+        """На странице подписок — авторы, на которых подписан
+        пользователь."""
+        people = self.walk(reverse('following', args=['test_author']))
+        self.assertEqual(people, [self.followers[0]])
+
+    def test_follow_buttons_use_viewer_subscriptions(self):
+        """Кнопки подписки отражают подписки зрителя, а не автора."""
+        Follow.objects.create(user=self.followers[0],
+                              author=self.followers[6])
+        response = self.client.get(self.url)
+        self.assertContains(response, 'btn btn-sm btn-light', count=1)
+        self.assertContains(response, 'btn btn-sm btn-primary', count=2)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        """Число запросов не зависит от размера страницы."""
+        counts = []
+        for per_page in (2, 5):
+            with self.settings(FOLLOW_LIST_PER_PAGE=per_page):
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(self.url)
+                counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    @override_settings(FOLLOW_LIST_CACHE_THRESHOLD=5)
+    def test_popular_author_list_is_cached(self):
+        """Список популярного автора читается из кэша."""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.context['page']), 3)
+        self.assertFalse(any('"posts_follow"."created"' in query['sql']
+                             for query in queries.captured_queries))
+
+    def test_unknown_user_not_found(self):
+        """Для несуществующего пользователя список не найден."""
+        response = self.client.get(reverse('followers', args=['nobody']))
+        self.assertEqual(response.status_code, 404)
@@ -1,11 +1,13 @@
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase
+from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import CommentForm, PostForm
 from posts.models import Comment, Group, Post
@@ -94,6 +96,58 @@ class PostFormTests(TestCase):
             text=form_data['text']).exists())
 
 
+def make_jpeg(size, exif=None):
+    image = Image.new('RGB', size, 'blue')
+    buffer = BytesIO()
+    if exif is None:
+        image.save(buffer, 'JPEG')
+    else:
+        image.save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile('photo.jpeg', buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+class PostImageNormalizationTests(TestCase):
+    def clean_image(self, upload):
+        form = PostForm(data={'title': 'Заголовок', 'text': 'Текст'},
+                        files={'image': upload})
+        form.is_valid()
+        return form
+
+    @override_settings(POST_IMAGE_MAX_DIMENSION=500)
+    def test_large_image_is_downscaled_without_exif(self):
+        """Большое изображение уменьшается, а EXIF удаляется."""
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera'
+        form = self.clean_image(make_jpeg((2000, 1000), exif=exif))
+        self.assertNotIn('image', form.errors)
+        with Image.open(form.cleaned_data['image']) as image:
+            self.assertEqual(image.size, (500, 250))
+            self.assertEqual(dict(image.getexif()), {})
+        self.assertEqual(form.cleaned_data['image'].name, 'photo.jpg')
+
+    def test_gif_is_kept(self):
+        """GIF сохраняется без перекодирования."""
+        content = BytesIO()
+        Image.new('P', (10, 10)).save(content, 'GIF')
+        upload = SimpleUploadedFile('anim.gif', content.getvalue(),
+                                    content_type='image/gif')
+        form = self.clean_image(upload)
+        self.assertIs(form.cleaned_data['image'], upload)
+
+    @override_settings(POST_IMAGE_MAX_PIXELS=100 * 100)
+    def test_too_many_pixels_rejected(self):
+        """Изображение с огромным разрешением отклоняется."""
+        form = self.clean_image(make_jpeg((101, 100)))
+        self.assertIn('image', form.errors)
+
+    @override_settings(POST_IMAGE_MAX_UPLOAD_SIZE=100)
+    def test_too_large_file_rejected(self):
+        """Слишком большой файл отклоняется."""
+        form = self.clean_image(make_jpeg((100, 100)))
+        self.assertIn('image', form.errors)
+
+
 class CommentFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
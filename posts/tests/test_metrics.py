@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post
+from yatube.metrics import registry
+
+User = get_user_model()
+
+
+@override_settings(METRICS_SAMPLE_RATE=1)
+class MetricsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        user = User.objects.create_user(username='test_user')
+        Post.objects.create(text='Тестовый текст', author=user)
+
+    def setUp(self):
+        cache.clear()
+        registry.reset()
+
+    def test_request_is_recorded_by_view_name(self):
+        """Запрос учитывается в метриках своего маршрута."""
+        self.client.get(reverse('index'))
+        self.client.get(reverse('index'))
+        stats = registry.counters
+        self.assertEqual(stats['requests_total', 'index', '2xx'], 2)
+        self.assertGreater(stats['sql_seconds_total', 'index', None], 0)
+        self.assertGreater(stats['template_seconds_total', 'index', None], 0)
+        self.assertGreater(stats['cache_misses_total', 'index', None], 0)
+        self.assertGreater(stats['cache_hits_total', 'index', None], 0)
+        self.assertEqual(sum(registry.latency['index'].counts), 2)
+        self.assertGreater(registry.queries['index'].sum, 0)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_off_records_nothing(self):
+        """При нулевой доле выборки метрики не собираются."""
+        self.client.get(reverse('index'))
+        self.assertEqual(registry.counters, {})
+
+    def test_endpoint_exports_prometheus_format(self):
+        """Страница метрик отдаёт гистограммы и счётчики."""
+        self.client.get(reverse('index'))
+        response = self.client.get(reverse('metrics'))
+        self.assertContains(
+            response, 'yatube_request_seconds_count{view="index"} 1')
+        self.assertContains(
+            response, 'yatube_requests_total{view="index",status="2xx"} 1')
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_endpoint_hidden_from_other_addresses(self):
+        """С посторонних адресов страница метрик недоступна."""
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 404)
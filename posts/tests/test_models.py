@@ -1,7 +1,10 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
 from django.test import Client, TestCase
 
-from posts.models import Comment, Follow, Group, Post
+from posts.models import Comment, Follow, Group, Post, UserStats
 
 User = get_user_model()
 
@@ -152,3 +155,57 @@ class FollowModelTest(TestCase):
         follow = FollowModelTest.follow
         expected_object_name = f"{follow.user} follows {follow.author}"
         self.assertEquals(expected_object_name, str(follow))
+
+
+class CountersTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.author = User.objects.create_user(username='test_author')
+
+    def get_stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_creates_and_deletes(self):
+        """Счётчики постов, подписок и комментариев обновляются при
+        создании и удалении объектов."""
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        comment = Comment.objects.create(text='Комментарий', author=self.user,
+                                         post=post)
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.get_stats(self.author).posts_count, 1)
+        self.assertEqual(self.get_stats(self.author).followers_count, 1)
+        self.assertEqual(self.get_stats(self.user).following_count, 1)
+
+        comment.delete()
+        follow.delete()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(self.get_stats(self.author).followers_count, 0)
+        self.assertEqual(self.get_stats(self.user).following_count, 0)
+        post.delete()
+        self.assertEqual(self.get_stats(self.author).posts_count, 0)
+
+    def test_recount_stats_fixes_drift(self):
+        """Команда recount_stats восстанавливает разошедшиеся счётчики."""
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        Comment.objects.create(text='Комментарий', author=self.user,
+                               post=post)
+        Follow.objects.create(user=self.user, author=self.author)
+        UserStats.objects.update(posts_count=42, followers_count=42,
+                                 following_count=42)
+        UserStats.objects.filter(user=self.user).delete()
+        Post.objects.update(comment_count=42)
+
+        call_command('recount_stats', stdout=StringIO())
+
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+        author_stats = self.get_stats(self.author)
+        self.assertEqual(author_stats.posts_count, 1)
+        self.assertEqual(author_stats.followers_count, 1)
+        self.assertEqual(author_stats.following_count, 0)
+        self.assertEqual(self.get_stats(self.user).following_count, 1)
@@ -0,0 +1,104 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import page_cache
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+@override_settings(PAGE_CACHE_ENABLED=True)
+class AnonymousPageCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='test_author')
+        self.group = Group.objects.create(title='Тестовая группа',
+                                          slug='test-slug',
+                                          description='Описание')
+        self.other_group = Group.objects.create(title='Другая группа',
+                                                slug='other-slug',
+                                                description='Описание')
+        self.post = Post.objects.create(text='Тестовый текст',
+                                        author=self.author,
+                                        group=self.group)
+        self.urls = {
+            'index': reverse('index'),
+            'group': reverse('group', args=['test-slug']),
+            'other_group': reverse('group', args=['other-slug']),
+            'profile': reverse('profile', args=['test_author']),
+            'post': reverse('post', args=['test_author', self.post.pk]),
+        }
+
+    def status(self, name):
+        return Client().get(self.urls[name]).get('X-Page-Cache')
+
+    def warm(self):
+        for name in self.urls:
+            Client().get(self.urls[name])
+
+    def test_hit_runs_no_queries(self):
+        """Повторный запрос анонима отдаётся из кэша без запросов к базе."""
+        response = Client().get(self.urls['post'])
+        self.assertEqual(response['X-Page-Cache'], 'MISS')
+        self.assertIn('post:', response['Surrogate-Key'])
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(self.urls['post'])
+        self.assertEqual(response['X-Page-Cache'], 'HIT')
+        self.assertEqual(len(queries), 0)
+        self.assertContains(response, 'Тестовый текст')
+
+    def test_authenticated_users_bypass_cache(self):
+        """Вошедшие пользователи всегда получают свежую страницу."""
+        client = Client()
+        client.force_login(self.author)
+        client.get(self.urls['index'])
+        self.assertFalse(client.get(self.urls['index']).has_header(
+            'X-Page-Cache'))
+
+    def test_comment_purges_only_pages_with_post(self):
+        """Комментарий сбрасывает страницы, где виден пост, и не трогает
+        остальные."""
+        self.warm()
+        Comment.objects.create(text='Комментарий', author=self.author,
+                               post=self.post)
+        for name in ('index', 'group', 'profile', 'post'):
+            with self.subTest(page=name):
+                self.assertEqual(self.status(name), 'MISS')
+        self.assertEqual(self.status('other_group'), 'HIT')
+
+    def test_moving_post_purges_both_groups(self):
+        """Перенос поста в другую группу сбрасывает обе страницы групп."""
+        self.warm()
+        self.post.group = self.other_group
+        self.post.save()
+        self.assertEqual(self.status('group'), 'MISS')
+        self.assertEqual(self.status('other_group'), 'MISS')
+
+    def test_follow_purges_author_pages(self):
+        """Подписка меняет счётчики в профиле автора."""
+        self.warm()
+        reader = User.objects.create_user(username='test_reader')
+        Follow.objects.create(user=reader, author=self.author)
+        self.assertEqual(self.status('profile'), 'MISS')
+        self.assertEqual(self.status('other_group'), 'HIT')
+
+    def test_purge_during_rendering_is_not_stored(self):
+        """Страница, во время рендеринга которой прошёл purge, могла
+        собраться из старых данных и не сохраняется."""
+        tag_page = page_cache.tag_page
+
+        def purge_after_tagging(request, page, *tags):
+            tag_page(request, page, *tags)
+            page_cache.purge(page_cache.post_tag(self.post.pk))
+
+        with mock.patch.object(page_cache, 'tag_page',
+                               side_effect=purge_after_tagging):
+            self.assertIsNone(self.status('index'))
+        self.assertEqual(self.status('index'), 'MISS')
+        self.assertEqual(self.status('index'), 'HIT')
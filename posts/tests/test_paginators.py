@@ -0,0 +1,119 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Post
+from posts.paginators import (CursorPage, CursorPaginator, decode_cursor,
+                              elided_page_range, encode_cursor)
+
+User = get_user_model()
+
+
+class CursorPaginatorTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='test_user')
+        cls.POSTS_COUNT = 25
+        Post.objects.bulk_create([Post(
+            text=f'Тестовое сообщение{i}',
+            author=cls.user)
+            for i in range(cls.POSTS_COUNT)])
+        cls.ordered = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def test_cursor_roundtrip(self):
+        """Курсор кодирует и раскодирует пару (pub_date, pk)."""
+        post = self.ordered[0]
+        token = encode_cursor(post.pub_date, post.pk)
+        self.assertEqual(decode_cursor(token), (post.pub_date, post.pk))
+
+    def test_walk_forward_and_back(self):
+        """Проход по ленте курсорами возвращает все записи без повторов,
+        а шаг назад возвращает предыдущую страницу."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        pages = [paginator.get_page()]
+        while pages[-1].has_next():
+            pages.append(paginator.get_page(before=pages[-1].next_cursor))
+        seen = [post for page in pages for post in page]
+        self.assertEqual(seen, self.ordered)
+        self.assertEqual([len(page) for page in pages], [10, 10, 5])
+        self.assertFalse(pages[0].has_previous())
+
+        back = paginator.get_page(after=pages[2].previous_cursor)
+        self.assertEqual(list(back), list(pages[1]))
+        first = paginator.get_page(after=pages[1].previous_cursor)
+        self.assertEqual(list(first), list(pages[0]))
+        self.assertFalse(first.has_previous())
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Битый курсор возвращает первую страницу."""
+        page = CursorPaginator(Post.objects.all(), 10).get_page(
+            before='не-курсор')
+        self.assertEqual(list(page), self.ordered[:10])
+
+    def test_page_issues_no_count_query(self):
+        """Страница строится одним запросом без COUNT и OFFSET."""
+        page = CursorPaginator(Post.objects.all(), 10).get_page()
+        with CaptureQueriesContext(connection) as queries:
+            CursorPaginator(Post.objects.all(), 10).get_page(
+                before=page.next_cursor)
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql'].upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+    @override_settings(CURSOR_PAGINATED_FEEDS=('index',))
+    def test_index_renders_cursor_links(self):
+        """Главная страница в режиме курсоров выводит ссылки before/after."""
+        cache.clear()
+        response = Client().get(reverse('index'))
+        page = response.context['page']
+        self.assertTrue(page.is_cursor)
+        self.assertContains(response, f'?before={page.next_cursor}')
+        response = Client().get(
+            reverse('index') + f'?before={page.next_cursor}')
+        self.assertContains(
+            response, f'?after={response.context["page"].previous_cursor}')
+
+
+class ElidedPageRangeTest(SimpleTestCase):
+    def get_page(self, pages, number):
+        return Paginator(range(pages * 10), 10).get_page(number)
+
+    def test_window_around_current_page(self):
+        """Выводятся края, окно вокруг текущей страницы и пропуски."""
+        cases = {
+            (5, 3): [1, 2, 3, 4, 5],
+            (100, 1): [1, 2, 3, None, 100],
+            (100, 50): [1, None, 48, 49, 50, 51, 52, None, 100],
+            (100, 99): [1, None, 97, 98, 99, 100],
+        }
+        for (pages, number), expected in cases.items():
+            with self.subTest(pages=pages, number=number):
+                page = self.get_page(pages, number)
+                self.assertEqual(
+                    elided_page_range(page, on_each_side=2, on_ends=1),
+                    expected)
+
+    def test_cursor_page_has_no_numbers(self):
+        """У страницы с курсорами номеров нет."""
+        page = CursorPage([], CursorPaginator(Post.objects.none(), 10))
+        self.assertEqual(elided_page_range(page), [])
+
+    def test_rendered_size_does_not_grow(self):
+        """Размер пагинатора не растёт с числом страниц: разница только
+        в числе цифр номеров."""
+        sizes = []
+        for pages in (100, 10_000, 1_000_000):
+            page = self.get_page(pages, pages // 2)
+            html = render_to_string('include/paginator.html', {
+                'page': page,
+                'page_range': elided_page_range(page)})
+            self.assertEqual(html.count('class="page-item'), 13)
+            sizes.append(len(html))
+        self.assertLess(max(sizes) - min(sizes), 100)
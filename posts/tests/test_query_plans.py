@@ -0,0 +1,90 @@
+import re
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+from posts.paginators import encode_cursor
+
+User = get_user_model()
+
+FULL_SCAN_RE = re.compile(r"^SCAN (TABLE )?\S+$")
+TEMP_SORT = "USE TEMP B-TREE"
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite',
+                     'EXPLAIN QUERY PLAN есть только в SQLite')
+class FeedQueryPlanTest(TestCase):
+    """Запросы лент читают посты по индексам: без полного просмотра
+    таблиц и без сортировки во временном B-дереве."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='test_reader')
+        cls.author = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(title='Тестовая группа',
+                                         slug='test-slug',
+                                         description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(15):
+            cls.post = Post.objects.create(text=f'Тестовый текст {i}',
+                                           author=cls.author,
+                                           group=cls.group)
+            Comment.objects.create(text='Комментарий', author=cls.reader,
+                                   post=cls.post)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def get_urls(self):
+        cursor = encode_cursor(self.post.pub_date, self.post.pk)
+        comment = self.post.comments.get()
+        comment_cursor = encode_cursor(comment.created, comment.pk)
+        return {
+            'index': reverse('index'),
+            'index_page': reverse('index') + '?page=2',
+            'index_cursor': reverse('index') + f'?before={cursor}',
+            'group': reverse('group', kwargs={'slug': 'test-slug'}),
+            'profile': reverse('profile',
+                               kwargs={'username': 'test_author'}),
+            'post': reverse('post', kwargs={'username': 'test_author',
+                                            'post_id': self.post.pk}),
+            'follow_index': reverse('follow_index'),
+            'suggestions': reverse('follow_suggestions'),
+            'followers': reverse('followers',
+                                 kwargs={'username': 'test_author'}),
+            'following': reverse('following',
+                                 kwargs={'username': 'test_reader'}),
+            'comments': reverse('post_comments',
+                                kwargs={'username': 'test_author',
+                                        'post_id': self.post.pk})
+            + f'?before={comment_cursor}',
+        }
+
+    def explain(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def capture_selects(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as context:
+            response = self.reader_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        # captured_queries содержит SQL с подставленными параметрами.
+        return [query['sql'] for query in context.captured_queries
+                if query['sql'].startswith('SELECT')]
+
+    def test_feeds_use_indexes(self):
+        for name, url in self.get_urls().items():
+            for sql in self.capture_selects(url):
+                plan = self.explain(sql, ())
+                with self.subTest(page=name, sql=sql[:120], plan=plan):
+                    for step in plan:
+                        self.assertNotRegex(step, FULL_SCAN_RE)
+                        self.assertNotIn(TEMP_SORT, step)
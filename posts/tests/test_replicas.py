@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import resolve, reverse
+
+from posts.models import Comment, Post
+from yatube.replicas import ReplicaMiddleware, ReplicaRouter, mark_write
+
+User = get_user_model()
+
+REPLICA = 'replica_test'
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_PIN_SECONDS=5,
+                   REPLICA_PIN_COOKIE='primary_pin')
+class ReplicaRoutingTest(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def call(self, method, url, cookies=None, write=False):
+        """Проводит запрос через middleware и возвращает базу, выбранную
+        для чтения во время представления, и ответ."""
+        request = getattr(self.factory, method)(url)
+        request.COOKIES.update(cookies or {})
+        request.resolver_match = resolve(request.path)
+        seen = {}
+
+        def view(request):
+            middleware.process_view(request, None, (), {})
+            seen['db'] = self.router.db_for_read(Post)
+            if write:
+                mark_write()
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        response = middleware(request)
+        return seen['db'], response
+
+    def test_read_views_use_replica(self):
+        """GET-запросы лент читают с реплики."""
+        for url in (reverse('index'), reverse('profile', args=['author']),
+                    reverse('post', args=['author', 1])):
+            with self.subTest(url=url):
+                self.assertEqual(self.call('get', url)[0], 'replica1')
+
+    def test_other_requests_use_primary(self):
+        """POST-запросы и представления вне списка читают из основной
+        базы, вне запроса реплики тоже не используются."""
+        self.assertIsNone(self.call('post', reverse('index'))[0])
+        self.assertIsNone(self.call('get', reverse('new_post'))[0])
+        self.assertIsNone(self.router.db_for_read(Post))
+        self.assertEqual(self.router.db_for_write(Post), 'default')
+
+    def test_write_pins_reader_to_primary(self):
+        """После записи пользователь читает из основной базы, пока
+        не истечёт срок закрепления."""
+        url = reverse('add_comment', args=['author', 1])
+        _, response = self.call('post', url, write=True)
+        pin = response.cookies['primary_pin']
+        self.assertEqual(pin['max-age'], 5)
+        cookies = {'primary_pin': pin.value}
+        self.assertIsNone(self.call('get', reverse('index'), cookies)[0])
+        expired = {'primary_pin': str(time.time() - 1)}
+        self.assertEqual(self.call('get', reverse('index'), expired)[0],
+                         'replica1')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        """Без реплик роутер ничего не меняет и не ставит cookie."""
+        self.assertIsNone(self.call('get', reverse('index'))[0])
+        url = reverse('add_comment', args=['author', 1])
+        _, response = self.call('post', url, write=True)
+        self.assertNotIn('primary_pin', response.cookies)
+
+
+@override_settings(DATABASE_REPLICAS=[REPLICA], REPLICA_PIN_SECONDS=5,
+                   REPLICA_PIN_COOKIE='primary_pin')
+class ReplicaDatabaseTest(TransactionTestCase):
+    """Реплика — отдельный файл SQLite с другими данными, поэтому по
+    ответу видно, из какой базы шло чтение."""
+    databases = {'default', REPLICA}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        connections.databases[REPLICA] = {
+            'ENGINE': connections.databases['default']['ENGINE'],
+            'NAME': os.path.join(cls.directory, 'replica.sqlite3'),
+        }
+        call_command('migrate', database=REPLICA, verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.post = Post.objects.create(
+            author=self.author, title='Основная', text='Пост из основной базы')
+        # Строки реплики пишутся без сигналов: те пишут в основную базу.
+        User.objects.using(REPLICA).bulk_create(
+            [User(pk=self.author.pk, username='author')])
+        Post.objects.using(REPLICA).bulk_create([Post(
+            pk=self.post.pk, author_id=self.author.pk, title='Реплика',
+            text='Пост с реплики', pub_date=self.post.pub_date)])
+        self.reader = Client()
+        self.writer = Client()
+        self.writer.force_login(User.objects.create_user(username='writer'))
+
+    def get_index(self, client):
+        cache.clear()
+        return client.get(reverse('index')).content.decode()
+
+    def test_reads_from_replica_and_writes_to_primary(self):
+        """Ленты читаются с реплики, комментарий пишется в основную базу
+        и закрепляет автора за ней."""
+        self.assertIn('Пост с реплики', self.get_index(self.reader))
+
+        response = self.writer.post(
+            reverse('add_comment', args=['author', self.post.pk]),
+            {'text': 'Комментарий'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Comment.objects.using('default').exists())
+        self.assertFalse(Comment.objects.using(REPLICA).exists())
+        self.assertIn('primary_pin', response.cookies)
+        self.assertIn('Пост из основной базы', self.get_index(self.writer))
+
+    def test_read_without_write_does_not_pin(self):
+        """Чтение через get_or_create, нашедшее строку в основной базе,
+        не закрепляет читателя за ней."""
+        cache.clear()
+        response = self.reader.get(reverse('profile', args=['author']))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Пост с реплики')
+        self.assertNotIn('primary_pin', response.cookies)
@@ -0,0 +1,88 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, SimpleTestCase, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Comment, Post
+
+User = get_user_model()
+
+
+class StemTest(SimpleTestCase):
+    def test_russian_words_are_stemmed(self):
+        """Разные формы слова приводятся к одной основе."""
+        cases = {
+            'книги': 'книг',
+            'красивая': 'красив',
+            'программирование': 'программирован',
+            'котов': 'кот',
+            'ёлка': 'елк',
+        }
+        for word, expected in cases.items():
+            with self.subTest(word=word):
+                self.assertEqual(search.stem(word), expected)
+
+    def test_tokenize_drops_stop_words(self):
+        """Служебные слова не попадают в индекс."""
+        self.assertEqual(search.tokenize('Коты и собаки'), ['кот', 'собак'])
+
+
+class SearchBackendsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='test_user')
+        self.title_post = Post.objects.create(
+            title='Про котов', text='Длинный текст', author=self.user)
+        self.text_post = Post.objects.create(
+            title='Заметка', text='Встретил кота во дворе', author=self.user)
+        self.comment_post = Post.objects.create(
+            title='Погода', text='Дождь', author=self.user)
+        self.comment = Comment.objects.create(
+            text='Коты не любят дождь', author=self.user,
+            post=self.comment_post)
+
+    def get_backends(self):
+        backends = [search.TermTableBackend()]
+        if search.fts5_available():
+            backends.append(search.FTS5Backend())
+        for backend in backends:
+            search.rebuild_index(backend)
+        return backends
+
+    def test_results_are_ranked(self):
+        """Совпадение в заголовке важнее текста, текст важнее
+        комментария."""
+        for backend in self.get_backends():
+            with self.subTest(backend=backend.name):
+                self.assertEqual(
+                    backend.search(['кот'], 10),
+                    [self.title_post.pk, self.text_post.pk,
+                     self.comment_post.pk])
+
+    def test_all_terms_must_match(self):
+        """Пост находится, только если в нём есть все слова запроса."""
+        for backend in self.get_backends():
+            with self.subTest(backend=backend.name):
+                self.assertEqual(
+                    backend.search(search.tokenize('кот двор'), 10),
+                    [self.text_post.pk])
+
+    def test_index_follows_deletes(self):
+        """Удалённые комментарии и посты пропадают из выдачи."""
+        self.comment.delete()
+        self.text_post.delete()
+        self.assertEqual(search.search_posts('коты'), [self.title_post.pk])
+
+
+class SearchViewTest(TestCase):
+    def test_search_page_shows_found_posts(self):
+        """Страница поиска выводит найденные посты и сохраняет запрос
+        в ссылках пагинатора."""
+        user = User.objects.create_user(username='test_user')
+        for i in range(12):
+            Post.objects.create(text=f'Новости программирования {i}',
+                                author=user)
+        Post.objects.create(text='Рецепт пирога', author=user)
+        response = Client().get(reverse('search'), {'q': 'программирование'})
+        self.assertEqual(len(response.context['page'].object_list), 10)
+        self.assertNotContains(response, 'Рецепт пирога')
+        self.assertContains(response, '?q=%D0%BF')
@@ -0,0 +1,125 @@
+import io
+import random
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import suggestions
+from posts.models import Follow, FollowSuggestion
+
+User = get_user_model()
+
+
+def brute_force(edges, limit):
+    following = {}
+    for user, author in edges:
+        following.setdefault(user, set()).add(author)
+    result = {}
+    for user, authors in following.items():
+        scores = Counter(candidate for author in authors
+                         for candidate in following.get(author, ())
+                         if candidate != user and candidate not in authors)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        result[user] = ranked[:limit]
+    return {user: ranked for user, ranked in result.items() if ranked}
+
+
+class FollowGraphTest(TestCase):
+    def run_graph(self, edges, limit):
+        graph = suggestions.FollowGraph(*zip(*edges))
+        result = {}
+        for rows in graph.batches():
+            users, candidates, scores = graph.top_suggestions(rows, limit)
+            for user, candidate, score in zip(graph.ids[users],
+                                              graph.ids[candidates], scores):
+                result.setdefault(int(user), []).append(
+                    (int(candidate), int(score)))
+        return result
+
+    def test_matches_brute_force(self):
+        """Векторный расчёт совпадает с перебором на случайном графе."""
+        rnd = random.Random(0)
+        edges = {(rnd.randint(1, 60), rnd.randint(1, 60))
+                 for _ in range(600)}
+        edges = [(user, author) for user, author in edges if user != author]
+        self.assertEqual(self.run_graph(edges, 5), brute_force(edges, 5))
+
+    def test_small_batches(self):
+        """Разбиение на мелкие пачки не меняет результат."""
+        edges = [(1, 2), (1, 3), (2, 4), (3, 4), (3, 5), (4, 1), (5, 2)]
+        expected = self.run_graph(edges, 3)
+        old_batch = suggestions.BATCH_PAIRS
+        suggestions.BATCH_PAIRS = 1
+        try:
+            self.assertEqual(self.run_graph(edges, 3), expected)
+        finally:
+            suggestions.BATCH_PAIRS = old_batch
+        self.assertEqual(expected[1], [(4, 2), (5, 1)])
+
+
+class FollowSuggestionTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [User.objects.create_user(username=f'user{i}')
+                     for i in range(5)]
+        reader, first, second, popular, other = cls.users
+        for user, author in ((reader, first), (reader, second),
+                             (first, popular), (second, popular),
+                             (second, other), (first, reader)):
+            Follow.objects.create(user=user, author=author)
+        call_command('compute_follow_suggestions', stdout=io.StringIO())
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.users[0])
+
+    def test_command_stores_ranked_suggestions(self):
+        """Команда сохраняет кандидатов по убыванию оценки без себя
+        и без уже прочитанных авторов."""
+        stored = list(FollowSuggestion.objects.filter(user=self.users[0])
+                      .values_list('author__username', 'score'))
+        self.assertEqual(stored, [('user3', 2), ('user4', 1)])
+
+    def test_sidebar_block_reads_one_query(self):
+        """Блок «Кого читать» читает рекомендации одним запросом."""
+        self.client.get(reverse('follow_suggestions'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('follow_suggestions'))
+        suggestion_queries = [
+            query for query in queries.captured_queries
+            if 'posts_followsuggestion' in query['sql']]
+        self.assertEqual(len(suggestion_queries), 1)
+        self.assertContains(response, '@user3')
+
+    def test_follow_removes_suggestion(self):
+        """Подписка на рекомендованного автора убирает рекомендацию."""
+        Follow.objects.create(user=self.users[0], author=self.users[3])
+        self.assertFalse(FollowSuggestion.objects.filter(
+            user=self.users[0], author=self.users[3]).exists())
+
+    def test_recompute_replaces_rows_batch_by_batch(self):
+        """Пересчёт мелкими пачками заменяет рекомендации, в том числе
+        удаляет их у пользователей, выпавших из графа."""
+        reader, first, second, popular, other = self.users
+        ghost = User.objects.create_user(username='ghost')
+        FollowSuggestion.objects.create(user=ghost, author=reader, score=1)
+        Follow.objects.filter(user=second, author=other).delete()
+        old_batch = suggestions.BATCH_PAIRS
+        suggestions.BATCH_PAIRS = 1
+        try:
+            created = suggestions.compute(5)
+        finally:
+            suggestions.BATCH_PAIRS = old_batch
+        self.assertEqual(FollowSuggestion.objects.count(), created)
+        self.assertFalse(FollowSuggestion.objects.filter(
+            user=ghost).exists())
+        self.assertEqual(
+            list(FollowSuggestion.objects.filter(user=reader)
+                 .values_list('author__username', 'score')),
+            [('user3', 2)])
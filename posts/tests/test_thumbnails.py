@@ -0,0 +1,104 @@
+import shutil
+import tempfile
+import time
+from io import BytesIO, StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from posts import feed_cache, page_cache, thumbnails
+from posts.models import Post
+
+User = get_user_model()
+
+
+def make_image(name='photo.jpg', size=(1200, 800)):
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(),
+                              content_type='image/jpeg')
+
+
+class ThumbnailsTest(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+        cache.clear()
+        self.user = User.objects.create_user(username='test_user')
+        self.post = Post.objects.create(text='Тестовый текст',
+                                        author=self.user,
+                                        image=make_image())
+
+    def test_generate_builds_variants(self):
+        """Для каждой ширины создаются кадрированные WebP и JPEG."""
+        manifest = thumbnails.generate(self.post.image.name)
+        self.assertEqual(manifest['sources'][0]['type'], 'image/webp')
+        self.assertTrue(manifest['src'].endswith('_960w.jpg'))
+        for srcset in (manifest['srcset'],
+                       manifest['sources'][0]['srcset']):
+            entries = [entry.split() for entry in srcset.split(', ')]
+            self.assertEqual([width for _, width in entries],
+                             ['320w', '640w', '960w'])
+            for url, width in entries:
+                name = url[len(settings.MEDIA_URL):]
+                with default_storage.open(name) as variant:
+                    self.assertEqual(Image.open(variant).size,
+                                     (int(width[:-1]),
+                                      round(int(width[:-1]) * 339 / 960)))
+
+    def test_variant_names_depend_on_content(self):
+        """Имя варианта меняется вместе с содержимым файла."""
+        manifest = thumbnails.generate(self.post.image.name)
+        other = Post.objects.create(text='Другой текст', author=self.user,
+                                    image=make_image('other.jpg'))
+        other_manifest = thumbnails.generate(other.image.name)
+        self.assertEqual(manifest['srcset'], other_manifest['srcset'])
+        self.assertEqual(manifest['src'],
+                         thumbnails.generate(self.post.image.name,
+                                             force=True)['src'])
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_synchronous_mode_returns_manifest(self):
+        """Без пула потоков манифест возвращается сразу, и страница
+        выводит <picture> с вариантами."""
+        manifest = thumbnails.picture(self.post.image)
+        self.assertEqual(manifest, cache.get(
+            thumbnails.cache_key(self.post.image.name)))
+        response = self.client.get(reverse('index'))
+        self.assertContains(response, '<source type="image/webp"')
+        self.assertContains(response, manifest['srcset'])
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_pending_variants_fall_back_to_original(self):
+        """Пока варианты создаются в фоне, манифеста нет, затем он
+        появляется в кэше, а страницы с постом сбрасываются."""
+        tag = page_cache.post_tag(self.post.pk)
+        versions = feed_cache.get_versions(tag, feed_cache.POSTS)
+        self.assertIsNone(thumbnails.picture(self.post.image))
+        deadline = time.monotonic() + 5
+
+        def purged():
+            return all(new > old for new, old in zip(
+                feed_cache.get_versions(tag, feed_cache.POSTS), versions))
+
+        while not purged() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        self.assertTrue(purged())
+        self.assertIsNotNone(thumbnails.picture(self.post.image))
+
+    def test_command_generates_missing_variants(self):
+        """Команда generate_thumbnails создаёт варианты для всех постов."""
+        name = thumbnails.manifest_name(self.post.image.name)
+        default_storage.delete(name)
+        call_command('generate_thumbnails', '--workers=2', stdout=StringIO())
+        self.assertTrue(default_storage.exists(name))
@@ -0,0 +1,122 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from posts import follow_graph, timeline
+from posts.models import Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='test_reader')
+        cls.author = User.objects.create_user(username='test_author')
+        cls.stranger = User.objects.create_user(username='test_stranger')
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новый пост попадает в ленты подписчиков автора и только в них."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=post).exists())
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.stranger).exists())
+        self.assertEqual(list(timeline.feed_for(self.reader)), [post])
+
+    @override_settings(TIMELINE_BACKFILL=2)
+    def test_follow_backfills_and_unfollow_trims(self):
+        """Подписка добавляет последние посты автора в ленту, отписка
+        убирает их."""
+        posts = [Post.objects.create(text=f'Тестовый текст {i}',
+                                     author=self.author)
+                 for i in range(3)]
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            set(timeline.feed_for(self.reader)), set(posts[-2:]))
+        follow.delete()
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertFalse(timeline.feed_for(self.reader).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=0)
+    def test_celebrity_posts_are_pulled(self):
+        """Посты популярного автора не раскладываются по лентам, но
+        видны подписчикам."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(list(timeline.feed_for(self.reader)), [post])
+        self.assertFalse(timeline.feed_for(self.stranger).exists())
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=2, TIMELINE_FANOUT_HYSTERESIS=1)
+    def test_author_is_demoted_below_hysteresis_off_request(self):
+        """Отписка не раскладывает посты популярного автора: отметка
+        снимается только ниже порога с запасом, а посты раскладывает
+        rebuild_timelines --demoted, в том числе по лентам
+        подписавшихся, пока он был популярным."""
+        other = User.objects.create_user(username='test_other')
+        for user in (self.stranger, other, self.reader):
+            Follow.objects.create(user=user, author=self.author)
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        for user in (self.stranger, other):
+            Follow.objects.filter(user=user).delete()
+            self.assertFalse(TimelineEntry.objects.exists())
+            self.assertEqual(list(timeline.feed_for(self.reader)), [post])
+        self.assertTrue(timeline.is_celebrity(self.author.pk))
+        out = StringIO()
+        call_command('rebuild_timelines', '--demoted', stdout=out)
+        self.assertIn('1', out.getvalue())
+        self.assertFalse(timeline.is_celebrity(self.author.pk))
+        self.assertEqual(list(TimelineEntry.objects.values_list(
+            'user', 'post')), [(self.reader.pk, post.pk)])
+        self.assertEqual(list(timeline.feed_for(self.reader)), [post])
+
+    @override_settings(TIMELINE_FANOUT_LIMIT=1, TIMELINE_FANOUT_HYSTERESIS=1)
+    def test_author_near_limit_stays_celebrity(self):
+        """Автор, потерявший подписчиков, но не опустившийся ниже порога
+        с запасом, остаётся популярным."""
+        for user in (self.stranger, self.reader):
+            Follow.objects.create(user=user, author=self.author)
+        Follow.objects.filter(user=self.stranger).delete()
+        self.assertEqual(timeline.demote_pending(), 0)
+        self.assertTrue(timeline.is_celebrity(self.author.pk))
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(list(timeline.feed_for(self.reader)), [post])
+
+    def test_posts_with_same_date_keep_order(self):
+        """Посты с одинаковой датой идут в ленте по убыванию номера."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(text=f'Тестовый текст {i}',
+                                     author=self.author)
+                 for i in range(3)]
+        TimelineEntry.objects.update(pub_date=posts[0].pub_date)
+        self.assertEqual(list(timeline.feed_for(self.reader)),
+                         posts[::-1])
+
+
+@override_settings(FOLLOW_GRAPH_ENABLED=True, TIMELINE_FANOUT_LIMIT=0)
+class GraphTimelineTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        follow_graph.reset()
+        self.addCleanup(follow_graph.reset)
+        self.reader = User.objects.create_user(username='test_reader')
+        self.author = User.objects.create_user(username='test_author')
+
+    def test_celebrity_posts_are_pulled_with_graph(self):
+        """С графом подписок популярные авторы берутся из кэшированного
+        списка отмеченных, а не по числу подписчиков."""
+        follow_graph.get_graph()
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        self.assertFalse(TimelineEntry.objects.exists())
+        self.assertEqual(timeline.celebrity_ids(), {self.author.pk})
+        self.assertEqual(list(timeline.feed_for(self.reader)), [post])
@@ -4,8 +4,11 @@ import tempfile
 from django import forms
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 from posts.models import Comment, Follow, Group, Post
@@ -243,17 +246,175 @@ class PaginatorViewsTest(TestCase):
 
 
 class CacheTest(TestCase):
-    def test_cache_index_page(self):
-        client = Client()
-        user = User.objects.create(username='test_user')
-        Post.objects.create(
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='test_user')
+        self.reader = User.objects.create(username='test_reader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+        self.post = Post.objects.create(
             text='Test_text',
-            author=user,
+            author=self.user,
         )
+
+    def test_cache_index_page(self):
+        """Лента берётся из кэша, пока данные не изменились."""
+        client = Client()
         temp_response = client.get(reverse('index'))
+        Post.objects.filter(pk=self.post.pk).update(text='Changed_text')
+        response = client.get(reverse('index'))
+        self.assertEqual(temp_response.content, response.content)
+
+    def test_new_post_invalidates_index_cache(self):
+        """Новый пост сразу появляется в закэшированной ленте."""
+        client = Client()
+        client.get(reverse('index'))
         Post.objects.create(
             text='Test1_text',
-            author=user,
+            author=self.user,
         )
         response = client.get(reverse('index'))
-        self.assertEqual(temp_response.content, response.content)
+        self.assertContains(response, 'Test1_text')
+
+    def test_follow_feed_does_not_share_index_cache(self):
+        """Лента подписок не совпадает с закэшированной главной."""
+        self.reader_client.get(reverse('index'))
+        response = self.reader_client.get(reverse('follow_index'))
+        self.assertNotContains(response, 'Test_text')
+        Follow.objects.create(user=self.reader, author=self.user)
+        response = self.reader_client.get(reverse('follow_index'))
+        self.assertContains(response, 'Test_text')
+
+    def test_fragment_miss_is_recomputed_once(self):
+        """Промах фрагмента ленты пересчитывается через get_or_set,
+        попадание — нет."""
+        def recomputes():
+            return caches['default'].get_stats()['recomputes']
+
+        before = recomputes()
+        self.reader_client.get(reverse('index'))
+        self.assertEqual(recomputes(), before + 1)
+        self.reader_client.get(reverse('index'))
+        self.assertEqual(recomputes(), before + 1)
+
+
+class FeedQueryBudgetTest(TestCase):
+    """Число запросов на страницу ленты не зависит от числа постов."""
+    QUERY_BUDGET = {
+        'index': 4,
+        'group': 5,
+        'profile': 6,
+        'follow_index': 5,
+    }
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='test_reader')
+        cls.author = User.objects.create_user(username='test_author')
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.reader_client = Client()
+        cls.reader_client.force_login(cls.reader)
+
+    def setUp(self):
+        cache.clear()
+
+    def create_posts(self, count):
+        for i in range(count):
+            post = Post.objects.create(
+                text=f'Тестовое сообщение{i}',
+                author=self.author,
+                group=self.group,
+            )
+            Comment.objects.create(text='Комментарий', author=self.reader,
+                                   post=post)
+
+    def get_urls(self):
+        return {
+            'index': reverse('index'),
+            'group': reverse('group', kwargs={'slug': 'test-slug'}),
+            'profile': reverse('profile',
+                               kwargs={'username': 'test_author'}),
+            'follow_index': reverse('follow_index'),
+        }
+
+    def count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_feed_query_count_is_constant(self):
+        """Страница из одного и из десяти постов требует одинакового
+        числа запросов, не превышающего бюджет."""
+        self.create_posts(1)
+        small = {name: self.count_queries(url)
+                 for name, url in self.get_urls().items()}
+        self.create_posts(9)
+        for name, url in self.get_urls().items():
+            with self.subTest(page=name):
+                queries = self.count_queries(url)
+                self.assertEqual(queries, small[name])
+                self.assertLessEqual(queries, self.QUERY_BUDGET[name])
+
+
+class PostDetailTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='test_author')
+        cls.other = User.objects.create_user(username='test_other')
+        cls.group = Group.objects.create(
+            title='Тестовое название группы',
+            slug='test-slug',
+            description='Тестовое описание группы',
+        )
+        cls.post = Post.objects.create(text='Тестовый текст',
+                                       author=cls.author, group=cls.group)
+        Comment.objects.create(text='Комментарий', author=cls.other,
+                               post=cls.post)
+        cls.url = reverse('post', args=['test_author', cls.post.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.other)
+
+    def test_post_and_comments_take_two_queries(self):
+        """Пост с автором, счётчиками и группой читается одним запросом,
+        комментарии с авторами — вторым."""
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(response.context['posts_amount'], 1)
+        self.assertEqual(response.context['post'].group, self.group)
+
+    def test_post_of_another_author_is_not_found(self):
+        """Пост, не принадлежащий автору из адреса, не найден."""
+        for name in ('post', 'add_comment'):
+            with self.subTest(name=name):
+                response = self.client.get(
+                    reverse(name, args=['test_other', self.post.pk]))
+                self.assertEqual(response.status_code, 404)
+
+    def test_comment_is_saved_once_and_redirects(self):
+        """Комментарий, отправленный на страницу поста, сохраняется
+        один раз, после чего следует перенаправление."""
+        response = self.client.post(self.url, {'text': 'Новый комментарий'})
+        self.assertRedirects(response, self.url)
+        self.assertEqual(
+            Comment.objects.filter(text='Новый комментарий').count(), 1)
+
+    def test_invalid_comment_renders_form_errors(self):
+        """Пустой комментарий возвращает страницу поста с ошибкой формы."""
+        response = self.client.post(self.url, {'text': ''})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.context['form'].errors)
+        self.assertEqual(self.post.comments.count(), 1)
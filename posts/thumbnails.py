@@ -0,0 +1,188 @@
+"""Варианты изображений постов, создаваемые вне запроса.
+
+Для каждого изображения создаются кадрированные копии нескольких ширин
+(POST_IMAGE_WIDTHS) в форматах POST_IMAGE_FORMATS. Имена файлов содержат
+хэш содержимого, поэтому их можно отдавать с вечными заголовками
+кэширования. Список вариантов (манифест) хранится рядом с ними
+в хранилище и в кэше.
+
+Шаблон берёт манифест из кэша; если его ещё нет, ставит задачу в пул
+потоков и показывает исходное изображение. Такая страница попадает
+в кэш фрагментов и страниц, поэтому готовая задача сбрасывает их для
+своего поста. Задачи работают только с файловым хранилищем и кэшем,
+без обращений к базе.
+"""
+import hashlib
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from . import feed_cache, page_cache
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = "posts/variants"
+MIME_TYPES = {"jpeg": "image/jpeg", "webp": "image/webp"}
+EXTENSIONS = {"jpeg": "jpg", "webp": "webp"}
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def get_formats():
+    """Форматы из настроек, которые умеет кодировать Pillow."""
+    return [fmt for fmt in settings.POST_IMAGE_FORMATS
+            if fmt != "webp" or features.check("webp")]
+
+
+def get_sizes():
+    aspect_width, aspect_height = settings.POST_IMAGE_ASPECT
+    return [(width, round(width * aspect_height / aspect_width))
+            for width in sorted(settings.POST_IMAGE_WIDTHS)]
+
+
+def _digest(name):
+    # Смена настроек вариантов даёт новые ключи, старые манифесты
+    # просто перестают использоваться.
+    config = (get_sizes(), get_formats(), settings.THUMBNAIL_QUALITY)
+    return hashlib.md5(f"{name}:{config}".encode()).hexdigest()
+
+
+def cache_key(name):
+    return f"thumbnail:{_digest(name)}"
+
+
+def manifest_name(name):
+    return f"{VARIANTS_DIR}/{_digest(name)}.json"
+
+
+def render(source, size):
+    """Кадрирует по центру и масштабирует до size (в том числе вверх)."""
+    with Image.open(source) as image:
+        image.draft("RGB", size)
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        return ImageOps.fit(image, size, Image.LANCZOS)
+
+
+def encode(image, fmt):
+    buffer = BytesIO()
+    if fmt == "webp":
+        image.save(buffer, "WEBP", quality=settings.THUMBNAIL_QUALITY,
+                   method=4)
+    else:
+        image.save(buffer, "JPEG", quality=settings.THUMBNAIL_QUALITY,
+                   optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def save_variant(data, width, fmt):
+    """Сохраняет вариант под именем из хэша содержимого: одинаковые
+    файлы не дублируются, а изменённые получают новый адрес."""
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    name = f"{VARIANTS_DIR}/{digest}_{width}w.{EXTENSIONS[fmt]}"
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return default_storage.url(name)
+
+
+def srcset(variants):
+    return ", ".join(f"{url} {width}w" for width, url in variants)
+
+
+def build_manifest(name):
+    formats = get_formats()
+    variants = {fmt: [] for fmt in formats}
+    for size in get_sizes():
+        with default_storage.open(name) as source:
+            image = render(source, size)
+        for fmt in formats:
+            variants[fmt].append(
+                (size[0], save_variant(encode(image, fmt), size[0], fmt)))
+    fallback = "jpeg" if "jpeg" in variants else formats[-1]
+    return {
+        "src": variants[fallback][-1][1],
+        "srcset": srcset(variants[fallback]),
+        "sources": [{"type": MIME_TYPES[fmt], "srcset": srcset(items)}
+                    for fmt, items in variants.items() if fmt != fallback],
+        "sizes": settings.POST_IMAGE_SIZES,
+    }
+
+
+def generate(name, force=False):
+    target = manifest_name(name)
+    if not force and default_storage.exists(target):
+        with default_storage.open(target) as stored:
+            manifest = json.loads(stored.read().decode())
+    else:
+        if not default_storage.exists(name):
+            logger.warning("Нет исходного изображения %s", name)
+            return None
+        manifest = build_manifest(name)
+        default_storage.delete(target)
+        default_storage.save(target,
+                             ContentFile(json.dumps(manifest).encode()))
+    cache.set(cache_key(name), manifest, settings.THUMBNAIL_URL_TIMEOUT)
+    return manifest
+
+
+def _run(name, post_id):
+    try:
+        generate(name)
+        if post_id is not None:
+            # Пока задача шла, пост выводился с исходным изображением.
+            page_cache.purge(page_cache.post_tag(post_id))
+            feed_cache.bump(feed_cache.POSTS)
+    except Exception:
+        logger.exception("Не удалось создать варианты изображения %s", name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix="thumbnails")
+    return _executor
+
+
+def schedule(name, post_id=None):
+    """Без пула (THUMBNAIL_WORKERS = 0) варианты создаются сразу
+    и возвращается манифест. post_id — пост, страницы которого сбросить,
+    когда варианты будут готовы."""
+    if not settings.THUMBNAIL_WORKERS:
+        try:
+            return generate(name)
+        except Exception:
+            logger.exception("Не удалось создать варианты изображения %s",
+                             name)
+            return None
+    with _lock:
+        if name in _pending:
+            return None
+        _pending.add(name)
+    get_executor().submit(_run, name, post_id)
+    return None
+
+
+def picture(image):
+    """Манифест вариантов изображения или None, если они ещё создаются."""
+    if not image:
+        return None
+    manifest = cache.get(cache_key(image.name))
+    if manifest is None:
+        post = getattr(image, "instance", None)
+        manifest = schedule(image.name, post and post.pk)
+    return manifest
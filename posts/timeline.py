@@ -0,0 +1,173 @@
+"""Материализованная лента подписок.
+
+Новый пост раскладывается по лентам подписчиков автора при записи.
+Автор, у которого подписчиков стало больше TIMELINE_FANOUT_LIMIT,
+отмечается популярным (UserStats.celebrity): его посты не раскладываются,
+а подтягиваются при чтении ленты.
+
+Отметка снимается не на пороге, а когда подписчиков остаётся не больше
+TIMELINE_FANOUT_LIMIT - TIMELINE_FANOUT_HYSTERESIS, и не в запросе
+отписки: раскладка последних постов по лентам всех подписчиков — это
+до TIMELINE_BACKFILL × TIMELINE_FANOUT_LIMIT строк. Её делает
+demote_pending (rebuild_timelines --demoted) короткими транзакциями;
+пока отметка стоит, посты автора по-прежнему читаются напрямую.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from yatube.db import retry_on_locked
+
+from . import feed_cache, follow_graph
+from .models import Follow, Post, TimelineEntry, UserStats
+
+BATCH_SIZE = 1000
+
+
+def is_celebrity(author_id):
+    return UserStats.objects.filter(user_id=author_id,
+                                    celebrity=True).exists()
+
+
+def celebrity_ids():
+    """id популярных авторов; кэшируются под версией, которую меняет
+    каждое изменение отметки."""
+    version, = feed_cache.get_versions(feed_cache.CELEBRITIES)
+    return cache.get_or_set(
+        f"celebrities:{version}",
+        lambda: frozenset(UserStats.objects.filter(
+            celebrity=True).values_list("user_id", flat=True)),
+        settings.FEED_CACHE_TIMEOUT)
+
+
+def recent_posts(author_id):
+    return Post.objects.filter(author_id=author_id).order_by(
+        "-pub_date").values_list("pk", "pub_date")[:settings.TIMELINE_BACKFILL]
+
+
+@retry_on_locked
+def _insert(entries):
+    # Внутри транзакции запроса — просто вставка; вне её каждая пачка
+    # пишется своей короткой транзакцией.
+    TimelineEntry.objects.bulk_create(entries, ignore_conflicts=True)
+
+
+def spread(author_id, posts):
+    """Раскладывает посты (pk, pub_date) автора по лентам подписчиков."""
+    followers = Follow.objects.filter(
+        author_id=author_id).values_list("user_id", flat=True)
+    batch = []
+    for user_id in followers.iterator():
+        batch.extend(TimelineEntry(user_id=user_id, post_id=pk,
+                                   author_id=author_id, pub_date=pub_date)
+                     for pk, pub_date in posts)
+        if len(batch) >= BATCH_SIZE:
+            _insert(batch)
+            batch = []
+    _insert(batch)
+
+
+def fan_out(post):
+    if is_celebrity(post.author_id):
+        return
+    spread(post.author_id, [(post.pk, post.pub_date)])
+
+
+def followed(author_id):
+    """Вызывается после подписки и увеличения счётчика: отмечает автора
+    популярным, как только он перешёл порог."""
+    if UserStats.objects.filter(
+            user_id=author_id, celebrity=False,
+            followers_count__gt=settings.TIMELINE_FANOUT_LIMIT,
+    ).update(celebrity=True):
+        # Иначе список, прочитанный до фиксации, закэшируется под новой
+        # версией.
+        transaction.on_commit(
+            lambda: feed_cache.bump(feed_cache.CELEBRITIES))
+
+
+def demotable():
+    return UserStats.objects.filter(
+        celebrity=True,
+        followers_count__lte=(settings.TIMELINE_FANOUT_LIMIT
+                              - settings.TIMELINE_FANOUT_HYSTERESIS))
+
+
+def demote(author_id):
+    """Раскладывает последние посты автора по лентам подписчиков
+    и снимает с него отметку популярного. Возвращает False, если
+    за это время автор снова набрал подписчиков."""
+    started = timezone.now()
+    spread(author_id, list(recent_posts(author_id)))
+    if not demotable().filter(user_id=author_id).update(celebrity=False):
+        return False
+    feed_cache.bump(feed_cache.CELEBRITIES)
+    # Пока шла раскладка, отметка стояла: новые подписки и посты
+    # автора в ленты не попали.
+    newcomers = Follow.objects.filter(
+        author_id=author_id, created__gte=started).values_list(
+        "user_id", flat=True)
+    for user_id in newcomers.iterator():
+        backfill(user_id, author_id)
+    spread(author_id, list(Post.objects.filter(
+        author_id=author_id, pub_date__gte=started).values_list(
+        "pk", "pub_date")))
+    return True
+
+
+def demote_pending():
+    """Снимает отметку со всех авторов, опустившихся ниже порога;
+    возвращает их число."""
+    demoted = 0
+    for author_id in list(demotable().values_list("user_id", flat=True)):
+        demoted += demote(author_id)
+    return demoted
+
+
+def backfill(user_id, author_id):
+    if is_celebrity(author_id):
+        return
+    TimelineEntry.objects.bulk_create(
+        [TimelineEntry(user_id=user_id, post_id=pk, author_id=author_id,
+                       pub_date=pub_date)
+         for pk, pub_date in recent_posts(author_id)],
+        ignore_conflicts=True)
+
+
+def trim(user_id, author_id):
+    TimelineEntry.objects.filter(user_id=user_id,
+                                 author_id=author_id).delete()
+
+
+def rebuild(user_id):
+    TimelineEntry.objects.filter(user_id=user_id).delete()
+    authors = Follow.objects.filter(user_id=user_id).values_list(
+        "author_id", flat=True)
+    for author_id in authors.iterator():
+        backfill(user_id, author_id)
+
+
+def feed_for(user):
+    """Посты ленты подписок: материализованные записи плюс посты
+    популярных авторов, читаемые напрямую.
+
+    Без популярных авторов лента читается по индексу
+    timeline_user_pub_date уже отсортированной (номер поста различает
+    посты с одинаковой датой); объединение с их постами требует
+    сортировки, но встречается редко."""
+    graph = follow_graph.graph_for(user.pk)
+    if graph is None:
+        celebrities = list(Follow.objects.filter(
+            user=user, author__stats__celebrity=True,
+        ).order_by().values_list("author_id", flat=True))
+    else:
+        celebrities = [author_id for author_id in celebrity_ids()
+                       if graph.follows(user.pk, author_id)]
+    posts = Post.objects.for_feed()
+    if not celebrities:
+        return posts.filter(timeline_entries__user=user).order_by(
+            "-timeline_entries__pub_date", "-timeline_entries__post__id")
+    entries = TimelineEntry.objects.filter(user=user).values("post_id")
+    return posts.filter(Q(pk__in=entries) | Q(author_id__in=celebrities))
@@ -7,10 +7,17 @@ urlpatterns = [
     path("new", views.new_post, name="new_post"),
     path("group/<slug:slug>/", views.group_posts, name="group"),
     path("follow/", views.follow_index, name="follow_index"),
+    path("search/", views.post_search, name="search"),
+    path("suggestions/", views.follow_suggestions,
+         name="follow_suggestions"),
     path("<str:username>/follow/", views.profile_follow,
          name="profile_follow"),
     path("<str:username>/unfollow/", views.profile_unfollow,
          name="profile_unfollow"),
+    path("<str:username>/followers/", views.follow_list,
+         {"relation": "followers"}, name="followers"),
+    path("<str:username>/following/", views.follow_list,
+         {"relation": "following"}, name="following"),
     path("<str:username>/", views.profile, name="profile"),
     path("<str:username>/<int:post_id>/", views.post_view, name="post"),
     path(
@@ -25,6 +32,8 @@ urlpatterns = [
     ),
     path("<username>/<int:post_id>/comment/", views.add_comment,
          name="add_comment"),
+    path("<username>/<int:post_id>/comments/", views.post_comments,
+         name="post_comments"),
     path("<username>/<int:post_id>/<int:comment_id>/delete/",
          views.comment_delete,
          name="comment_delete"),
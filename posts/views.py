@@ -1,90 +1,213 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import condition
+from django.views.decorators.vary import vary_on_cookie
+
+from yatube.db import retry_on_locked
 
+from . import conditional, feed_cache, follows, page_cache, search, timeline
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post
+from .models import Comment, FollowSuggestion, Post, UserStats
+from .paginators import CursorPaginator, elided_page_range, encode_cursor
 
 User = get_user_model()
 
+POSTS_PER_PAGE = 10
+
+
+def paginate(request, post_list, feed):
+    before = request.GET.get("before")
+    after = request.GET.get("after")
+    if feed in settings.CURSOR_PAGINATED_FEEDS or before or after:
+        paginator = CursorPaginator(post_list, POSTS_PER_PAGE)
+        return paginator.get_page(before=before, after=after)
+    paginator = Paginator(post_list, POSTS_PER_PAGE)
+    return paginator.get_page(request.GET.get("page"))
+
+
+def page_links(page, view):
+    """Номера страниц для include/paginator.html; ширина окна вокруг
+    текущей страницы задаётся для представления в PAGINATOR_WINDOWS."""
+    return elided_page_range(
+        page, on_each_side=settings.PAGINATOR_WINDOWS.get(view, 3),
+        on_ends=settings.PAGINATOR_ON_ENDS)
+
+
+def comments_limit(request):
+    """Размер порции комментариев: ?limit=, но не больше
+    COMMENTS_MAX_PER_PAGE."""
+    try:
+        limit = int(request.GET.get("limit", settings.COMMENTS_PER_PAGE))
+    except ValueError:
+        limit = settings.COMMENTS_PER_PAGE
+    return max(1, min(limit, settings.COMMENTS_MAX_PER_PAGE))
+
+
+def first_comments(post, limit):
+    """Первая порция комментариев поста и курсор следующей. Остались
+    ли ещё комментарии, видно по post.comment_count без лишнего запроса."""
+    comments = post.comments.select_related("author")[:limit]
+    if post.comment_count <= limit or not comments:
+        return comments, None
+    last = comments[len(comments) - 1]
+    return comments, encode_cursor(last.created, last.pk)
+
 
 def index(request):
-    post_list = Post.objects.all()
-    paginator = Paginator(post_list, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    post_list = Post.objects.for_feed()
+    page = paginate(request, post_list, "index")
+    page_cache.tag_page(request, page, page_cache.INDEX)
     return render(
         request,
         "index.html",
-        {"page": page, }
+        {"page": page,
+         "page_range": page_links(page, "index"),
+         "cache_key": feed_cache.fragment_key(request, "index"),
+         "cache_timeout": settings.FEED_CACHE_TIMEOUT, }
     )
 
 
+@vary_on_cookie
+@condition(etag_func=conditional.group_etag)
 def group_posts(request, slug):
-    group = get_object_or_404(Group, slug=slug)
+    group = conditional.get_group(request, slug)
+    if group is None:
+        raise Http404
 
-    group_post_list = group.posts.all()
-    paginator = Paginator(group_post_list, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    group_post_list = Post.objects.for_feed().filter(group=group)
+    page = paginate(request, group_post_list, "group")
+    page_cache.tag_page(request, page, page_cache.group_tag(group.pk))
     return render(
         request,
         "group.html",
-        {"group": group, "page": page, }
+        {"group": group,
+         "page": page,
+         "page_range": page_links(page, "group"),
+         "cache_key": feed_cache.fragment_key(request, "group", group.pk),
+         "cache_timeout": settings.FEED_CACHE_TIMEOUT, }
+    )
+
+
+def post_search(request):
+    query = request.GET.get("q", "").strip()
+    post_ids = search.search_posts(query) if query else []
+    paginator = Paginator(post_ids, POSTS_PER_PAGE)
+    page = paginator.get_page(request.GET.get("page"))
+    posts = Post.objects.for_feed().in_bulk(page.object_list)
+    page.object_list = [posts[pk] for pk in page.object_list if pk in posts]
+    return render(
+        request,
+        "search.html",
+        {"page": page,
+         "page_range": page_links(page, "search"),
+         "query": query,
+         "query_string": urlencode({"q": query}), }
     )
 
 
+@retry_on_locked
+def insert_post(post):
+    # Неудачная попытка могла успеть присвоить pk; повтор — снова вставка.
+    post.pk = None
+    post._state.adding = True
+    post.save()
+
+
 @login_required
 def new_post(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        form.save()
+        # Файл записывается один раз, вне повторяемой транзакции: повтор
+        # при блокировке базы не должен оставлять копий в MEDIA_ROOT.
+        if post.image:
+            post.image.save(post.image.name, post.image.file, save=False)
+        try:
+            insert_post(post)
+        except Exception:
+            if post.image:
+                post.image.delete(save=False)
+            raise
         return redirect("index")
     return render(request, "new.html", {"form": form})
 
 
+@vary_on_cookie
+@condition(etag_func=conditional.profile_etag)
 def profile(request, username):
-    user = request.user
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    posts_amount = post_list.count()
-    followers = author.following.all().count()
-    following = author.follower.all().count()
-    paginator = Paginator(post_list, 10)
+    author = conditional.get_author(request, username)
+    if author is None:
+        raise Http404
+    stats = UserStats.for_user(author)
+    post_list = Post.objects.for_feed().filter(author=author)
+    paginator = Paginator(post_list, POSTS_PER_PAGE)
     page_number = request.GET.get("page")
     page = paginator.get_page(page_number)
-    following_status = False
-    if user.is_authenticated:
-        if Follow.objects.filter(user=user, author=author).exists():
-            following_status = True
+    page_cache.tag_page(request, page, page_cache.author_tag(author.pk))
+    following_status = author.is_following
     return render(
         request, "profile.html",
         {"author": author,
          "page": page,
-         "posts_amount": posts_amount,
-         "followers": followers,
-         "following": following,
+         "page_range": page_links(page, "profile"),
+         "posts_amount": stats.posts_count,
+         "followers": stats.followers_count,
+         "following": stats.following_count,
          "following_status": following_status, }
     )
 
 
-def post_view(request, username, post_id):
-    author = get_object_or_404(User, username=username)
-    post = get_object_or_404(Post, pk=post_id)
-    post_list = author.posts.all()
-    comments = post.comments.all()
-    posts_amount = post_list.count()
-    if request.method == "POST" and request.user.is_authenticated:
-        add_comment(request, username, post_id)
-    form = CommentForm()
+def render_post(request, post, form):
+    author = post.author
+    stats = UserStats.for_user(author)
+    comments, next_cursor = first_comments(post, comments_limit(request))
+    page_cache.tag(request, page_cache.post_tag(post.pk),
+                   page_cache.author_tag(author.pk))
+    if post.group_id:
+        page_cache.tag(request, page_cache.group_tag(post.group_id))
     return render(request, "post.html", {"form": form,
                                          "post": post,
                                          "author": author,
-                                         "posts_amount": posts_amount,
-                                         "comments": comments, })
+                                         "posts_amount": stats.posts_count,
+                                         "followers": stats.followers_count,
+                                         "following": stats.following_count,
+                                         "following_status": post.is_following,
+                                         "comments": comments,
+                                         "next_cursor": next_cursor, })
+
+
+@vary_on_cookie
+@condition(etag_func=conditional.post_etag)
+def post_view(request, username, post_id):
+    if request.method == "POST":
+        return add_comment(request, username, post_id)
+    post = conditional.get_post(request, username, post_id)
+    if post is None:
+        raise Http404
+    return render_post(request, post, CommentForm())
+
+
+@vary_on_cookie
+def post_comments(request, username, post_id):
+    """Фрагмент со следующей порцией комментариев для «Показать ещё»."""
+    post = get_object_or_404(Post.objects.select_related("author"),
+                             pk=post_id, author__username=username)
+    page_cache.tag(request, page_cache.post_tag(post.pk))
+    paginator = CursorPaginator(post.comments.select_related("author"),
+                                comments_limit(request), field="created")
+    page = paginator.get_page(before=request.GET.get("before"))
+    return render(request, "include/comments.html",
+                  {"post": post,
+                   "comments": page,
+                   "next_cursor": page.next_cursor,
+                   "is_fragment": True, })
 
 
 @login_required
@@ -112,24 +235,20 @@ def post_delete(request, username, post_id):
 
 
 @login_required
+@retry_on_locked
 def add_comment(request, username, post_id):
-    post = get_object_or_404(Post, pk=post_id, author__username=username)
-    post_list = post.author.posts.all()
-    comments = post.comments.all()
-    posts_amount = post_list.count()
-    form = CommentForm(request.POST)
+    post = conditional.get_post(request, username, post_id)
+    if post is None:
+        raise Http404
+    form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        form.save()
+        comment.save()
         return redirect("post", username=post.author.username,
                         post_id=post_id)
-    return render(request, 'post.html', {"form": form,
-                                         "post": post,
-                                         "author": post.author,
-                                         "posts_amount": posts_amount,
-                                         "comments": comments, })
+    return render_post(request, post, form)
 
 
 @login_required
@@ -143,37 +262,75 @@ def comment_delete(request, username, post_id, comment_id):
 
 @login_required
 def follow_index(request):
-    follow_post_list = Post.objects.filter(
-        author__following__user=request.user)
+    follow_post_list = timeline.feed_for(request.user)
 
-    paginator = Paginator(follow_post_list, 10)
-    page_number = request.GET.get("page")
-    page = paginator.get_page(page_number)
+    page = paginate(request, follow_post_list, "follow")
+    cache_key = feed_cache.fragment_key(
+        request, "follow", request.user.pk,
+        scopes=(feed_cache.POSTS, feed_cache.follow_scope(request.user.pk)))
     return render(request, "follow.html", {
-        "page": page, "paginator": paginator})
+        "page": page,
+        "paginator": page.paginator,
+        "page_range": page_links(page, "follow"),
+        "cache_key": cache_key,
+        "cache_timeout": settings.FEED_CACHE_TIMEOUT, })
+
+
+@vary_on_cookie
+def follow_list(request, username, relation):
+    author = conditional.get_author(request, username)
+    if author is None:
+        raise Http404
+    stats = UserStats.for_user(author)
+    page = follows.follow_list_page(author, relation,
+                                    before=request.GET.get("before"),
+                                    after=request.GET.get("after"))
+    page_cache.tag(request, page_cache.author_tag(author.pk))
+    return render(
+        request, "follow_list.html",
+        {"author": author,
+         "relation": relation,
+         "page": page,
+         "posts_amount": stats.posts_count,
+         "followers": stats.followers_count,
+         "following": stats.following_count,
+         "following_status": author.is_following, }
+    )
 
 
 @login_required
-def profile_follow(request, username):
-    author = get_object_or_404(User, username=username)
-    current_user = request.user
-    if Follow.objects.all().filter(user=current_user, author=author).exists():
-        return redirect("profile", username=author.username)
-    if current_user != author:
-        Follow.objects.create(user=current_user, author=author)
+def follow_suggestions(request):
+    """Блок «Кого читать» боковой панели; подгружается после страницы."""
+    suggestions = (FollowSuggestion.objects.filter(user=request.user)
+                   .select_related("author")
+                   [:settings.FOLLOW_SUGGESTIONS_SHOWN])
+    return render(request, "include/follow_suggestions.html",
+                  {"suggestions": suggestions})
+
+
+def follow_response(request, author, following):
+    """Для AJAX — JSON с новым состоянием подписки и числом подписчиков,
+    чтобы не перезагружать профиль; иначе — перенаправление в профиль."""
+    if request.is_ajax():
+        return JsonResponse({"following": following,
+                             "followers": follows.followers_count(author)})
     return redirect("profile", username=author.username)
 
 
 @login_required
-def profile_unfollow(request, username):
+@retry_on_locked
+def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    current_user = request.user
-    if Follow.objects.filter(user=current_user, author=author).exists():
-        Follow.objects.filter(user=current_user, author=author).delete()
-    return redirect("profile", username=author.username)
-
+    follows.follow(request.user, author)
+    return follow_response(request, author, request.user != author)
 
 
+@login_required
+@retry_on_locked
+def profile_unfollow(request, username):
+    author = get_object_or_404(User, username=username)
+    follows.unfollow(request.user, author)
+    return follow_response(request, author, False)
 
 
 def page_not_found(request, exception):
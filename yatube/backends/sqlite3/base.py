@@ -0,0 +1,32 @@
+"""SQLite с настройками соединения для продакшена.
+
+В OPTIONS["PRAGMAS"] передаются PRAGMA, которые выполняются на каждом
+новом соединении, например:
+
+    "OPTIONS": {
+        "timeout": 5,
+        "PRAGMAS": {
+            "journal_mode": "wal",
+            "synchronous": "normal",
+        },
+    }
+
+Остальные OPTIONS передаются в sqlite3.connect как обычно. Время
+ожидания блокировки задаёт timeout; PRAGMA busy_timeout выполнялась бы
+после соединения и заменила бы его.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        params.pop("PRAGMAS", None)
+        return params
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        pragmas = self.settings_dict["OPTIONS"].get("PRAGMAS", {})
+        for name, value in pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
@@ -0,0 +1,272 @@
+"""Двухуровневый кэш: LRU в памяти процесса (L1) перед общим кэшем (L2).
+
+L2 — любой другой бэкенд из CACHES, его alias указывается в LOCATION.
+Значения живут в L1 не дольше L1_TIMEOUT секунд, поэтому изменения,
+сделанные другими процессами, видны с ограниченной задержкой; ключи
+с префиксами из L1_BYPASS всегда читаются из L2.
+
+    CACHES = {
+        "default": {
+            "BACKEND": "yatube.cache.TieredCache",
+            "LOCATION": "shared",
+            "OPTIONS": {
+                "L1_MAX_ENTRIES": 1000,
+                "L1_MAX_BYTES": 16 * 1024 * 1024,
+                "L1_TIMEOUT": 5,
+                "L1_BYPASS": ("feed_version:",),
+                "TIMEOUTS": {"thumbnail:": 60 * 60},
+                "LOCK_TIMEOUT": 10,
+            },
+        },
+        "shared": {...},
+    }
+"""
+import pickle
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+MISSING = object()
+LOCK_STRIPES = 64
+LOCK_POLL_INTERVAL = 0.05
+
+
+class LRUStore:
+    def __init__(self, max_entries, max_bytes):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return MISSING
+            expires, payload = item
+            if expires is not None and expires <= time.monotonic():
+                self._pop(key)
+                return MISSING
+            self._data.move_to_end(key)
+        return pickle.loads(payload)
+
+    def set(self, key, value, timeout):
+        """Возвращает число вытесненных записей."""
+        payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(payload) > self.max_bytes:
+            self.delete(key)
+            return 0
+        expires = None if timeout is None else time.monotonic() + timeout
+        evicted = 0
+        with self._lock:
+            self._pop(key)
+            self._data[key] = (expires, payload)
+            self.size += len(payload)
+            while (len(self._data) > self.max_entries
+                   or self.size > self.max_bytes):
+                self._pop(next(iter(self._data)))
+                evicted += 1
+        return evicted
+
+    def delete(self, key):
+        with self._lock:
+            return self._pop(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.size = 0
+
+    def _pop(self, key):
+        item = self._data.pop(key, None)
+        if item is None:
+            return False
+        self.size -= len(item[1])
+        return True
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._shared_alias = location
+        self._l1 = LRUStore(options.get("L1_MAX_ENTRIES", 1000),
+                            options.get("L1_MAX_BYTES", 16 * 1024 * 1024))
+        self._l1_timeout = options.get("L1_TIMEOUT", 5)
+        self._l1_bypass = tuple(options.get("L1_BYPASS", ()))
+        self._timeouts = sorted(options.get("TIMEOUTS", {}).items(),
+                                key=lambda item: -len(item[0]))
+        self._lock_timeout = options.get("LOCK_TIMEOUT", 10)
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self.stats = Counter()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats["l1_entries"] = len(self._l1)
+        stats["l1_bytes"] = self._l1.size
+        return stats
+
+    def _count(self, event, amount=1):
+        self.stats[event] += amount
+        metrics.count_cache(event, amount)
+
+    def _uses_l1(self, key):
+        return not key.startswith(self._l1_bypass)
+
+    def _timeout(self, key, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            for prefix, prefix_timeout in self._timeouts:
+                if key.startswith(prefix):
+                    return prefix_timeout
+            return self.default_timeout
+        return timeout
+
+    def _l1_ttl(self, timeout):
+        if timeout is None:
+            return self._l1_timeout
+        return min(timeout, self._l1_timeout)
+
+    def _remember(self, key, value, timeout, version):
+        if self._uses_l1(key):
+            full_key = self.make_key(key, version)
+            ttl = self._l1_ttl(timeout)
+            if ttl > 0:
+                self._count("l1_evictions",
+                            self._l1.set(full_key, value, ttl))
+
+    def get(self, key, default=None, version=None):
+        full_key = self.make_key(key, version)
+        self.validate_key(full_key)
+        if self._uses_l1(key):
+            value = self._l1.get(full_key)
+            if value is not MISSING:
+                self._count("l1_hits")
+                return value
+        value = self.shared.get(key, MISSING, version=version)
+        if value is MISSING:
+            self._count("misses")
+            return default
+        self._count("l2_hits")
+        self._remember(key, value, None, version)
+        return value
+
+    def get_many(self, keys, version=None):
+        found = {}
+        rest = []
+        for key in keys:
+            value = MISSING
+            if self._uses_l1(key):
+                value = self._l1.get(self.make_key(key, version))
+            if value is MISSING:
+                rest.append(key)
+            else:
+                found[key] = value
+        self._count("l1_hits", len(found))
+        if rest:
+            shared = self.shared.get_many(rest, version=version)
+            self._count("l2_hits", len(shared))
+            self._count("misses", len(rest) - len(shared))
+            for key, value in shared.items():
+                self._remember(key, value, None, version)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(key, timeout)
+        self.shared.set(key, value, timeout, version=version)
+        self._remember(key, value, timeout, version)
+        self._count("sets")
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        for key, value in data.items():
+            self.set(key, value, timeout, version=version)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self._timeout(key, timeout)
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._remember(key, value, timeout, version)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, self._timeout(key, timeout),
+                                 version=version)
+
+    def delete(self, key, version=None):
+        self._l1.delete(self.make_key(key, version))
+        self.shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._l1.delete(self.make_key(key, version))
+        self.shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        if (self._uses_l1(key)
+                and self._l1.get(self.make_key(key, version)) is not MISSING):
+            return True
+        return self.shared.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        self._remember(key, value, None, version)
+        return value
+
+    def clear(self):
+        self._l1.clear()
+        self.shared.clear()
+
+    def _lock_for(self, full_key):
+        return self._locks[zlib.crc32(full_key.encode()) % LOCK_STRIPES]
+
+    def get_or_set(self, key, default, timeout=DEFAULT_TIMEOUT,
+                   version=None):
+        """Пересчитывает отсутствующее значение один раз: внутри
+        процесса ждём на блокировке, между процессами — на ключе-замке
+        в L2, пока значение вычисляет тот, кто взял замок первым."""
+        value = self.get(key, MISSING, version=version)
+        if value is not MISSING:
+            return value
+        full_key = self.make_key(key, version)
+        lock_key = f"{key}:lock"
+        with self._lock_for(full_key):
+            value = self.get(key, MISSING, version=version)
+            if value is not MISSING:
+                return value
+            acquired = self.shared.add(lock_key, 1, self._lock_timeout,
+                                       version=version)
+            if not acquired:
+                self._count("lock_waits")
+                deadline = time.monotonic() + self._lock_timeout
+                while time.monotonic() < deadline:
+                    time.sleep(LOCK_POLL_INTERVAL)
+                    value = self.shared.get(key, MISSING, version=version)
+                    if value is not MISSING:
+                        self._remember(key, value, None, version)
+                        return value
+                    if not self.shared.has_key(lock_key, version=version):
+                        break
+            try:
+                self._count("recomputes")
+                value = default() if callable(default) else default
+                if value is not None:
+                    self.set(key, value, timeout, version=version)
+            finally:
+                if acquired:
+                    self.shared.delete(lock_key, version=version)
+        return value
@@ -0,0 +1,44 @@
+"""Повтор записи, упавшей на блокировке SQLite.
+
+В режиме WAL читатели не мешают писателю, но писатель в базе один:
+если busy_timeout истёк или транзакцию нельзя повысить до пишущей,
+SQLite отвечает «database is locked». retry_on_locked выполняет
+представление в транзакции и при такой ошибке откатывает её и повторяет
+вызов с экспоненциальной задержкой.
+"""
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+logger = logging.getLogger(__name__)
+
+LOCKED_MESSAGES = ("database is locked", "database table is locked")
+
+
+def is_locked_error(error):
+    return any(message in str(error) for message in LOCKED_MESSAGES)
+
+
+def retry_on_locked(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        # Внутри чужой транзакции повтор невозможен: её уже не вернуть.
+        if connection.in_atomic_block:
+            return func(*args, **kwargs)
+        attempts = settings.DB_LOCK_RETRIES
+        for attempt in range(attempts + 1):
+            try:
+                with transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as error:
+                if attempt == attempts or not is_locked_error(error):
+                    raise
+                delay = settings.DB_LOCK_RETRY_DELAY * 2 ** attempt
+                logger.warning("%s: база заблокирована, повтор через %.3f с",
+                               func.__name__, delay)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+    return wrapper
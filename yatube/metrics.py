@@ -0,0 +1,198 @@
+"""Метрики запросов для продакшена.
+
+MetricsMiddleware для выборки запросов (доля METRICS_SAMPLE_RATE)
+собирает по имени маршрута гистограммы времени ответа и числа SQL-запросов,
+суммарное время SQL и рендеринга шаблонов, попадания и промахи кэша.
+Невыбранные запросы проходят без обёрток. Метрики хранятся в памяти
+процесса и отдаются в текстовом формате Prometheus представлением
+metrics_view, доступным только с адресов METRICS_ALLOWED_IPS.
+
+Время шаблонов считает бэкенд TimedDjangoTemplates, кэша — TieredCache
+через count_cache.
+"""
+import random
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django.template.backends.django import DjangoTemplates
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                   5.0, 10.0)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200)
+CACHE_EVENTS = {"l1_hits": "hit", "l2_hits": "hit", "misses": "miss"}
+
+_local = threading.local()
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {total}'
+        total += self.counts[-1]
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {total}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {total}"
+
+
+class RequestStats:
+    __slots__ = ("queries", "sql_time", "template_time", "cache_hits",
+                 "cache_misses")
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        """Обёртка connection.execute_wrapper."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+            self.counters = defaultdict(float)
+
+    def record(self, view, status, duration, stats):
+        with self._lock:
+            self.latency[view].observe(duration)
+            self.queries[view].observe(stats.queries)
+            counters = self.counters
+            counters["requests_total", view, f"{status // 100}xx"] += 1
+            counters["sql_seconds_total", view, None] += stats.sql_time
+            counters["template_seconds_total", view, None] += (
+                stats.template_time)
+            counters["cache_hits_total", view, None] += stats.cache_hits
+            counters["cache_misses_total", view, None] += stats.cache_misses
+
+    def render(self):
+        lines = []
+        with self._lock:
+            lines.append("# TYPE yatube_request_seconds histogram")
+            for view, histogram in sorted(self.latency.items()):
+                lines.extend(histogram.lines("yatube_request_seconds",
+                                             f'view="{view}"'))
+            lines.append("# TYPE yatube_request_queries histogram")
+            for view, histogram in sorted(self.queries.items()):
+                lines.extend(histogram.lines("yatube_request_queries",
+                                             f'view="{view}"'))
+            names = sorted({name for name, _, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE yatube_{name} counter")
+                for (metric, view, status), value in sorted(
+                        self.counters.items(), key=str):
+                    if metric != name:
+                        continue
+                    labels = f'view="{view}"'
+                    if status:
+                        labels += f',status="{status}"'
+                    lines.append(f"yatube_{name}{{{labels}}} {value:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def current():
+    """Статистика текущего запроса или None, если он не в выборке."""
+    return getattr(_local, "stats", None)
+
+
+def count_cache(event, amount=1):
+    stats = current()
+    if stats is None or event not in CACHE_EVENTS:
+        return
+    if CACHE_EVENTS[event] == "hit":
+        stats.cache_hits += amount
+    else:
+        stats.cache_misses += amount
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = settings.METRICS_SAMPLE_RATE
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+        stats = _local.stats = RequestStats()
+        wrappers = [connection.execute_wrapper(stats)
+                    for connection in connections.all()]
+        start = time.perf_counter()
+        try:
+            for wrapper in wrappers:
+                wrapper.__enter__()
+            response = self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+            _local.stats = None
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "unresolved"
+        registry.record(view, response.status_code,
+                        time.perf_counter() - start, stats)
+        return response
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+        self.origin = template.origin
+
+    def render(self, context=None, request=None):
+        stats = current()
+        if stats is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates, засекающий время рендеринга шаблонов верхнего
+    уровня; include и extends входят в их время."""
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def metrics_view(request):
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(registry.render(),
+                        content_type="text/plain; version=0.0.4")
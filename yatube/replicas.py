@@ -0,0 +1,101 @@
+"""Чтение с реплик базы данных.
+
+ReplicaMiddleware помечает GET- и HEAD-запросы к представлениям из
+REPLICA_READ_VIEWS, и на время такого запроса ReplicaRouter отправляет
+чтение на одну из реплик DATABASE_REPLICAS. Запись всегда идёт
+в основную базу.
+
+Реплика может отставать, поэтому после записи пользователь
+REPLICA_PIN_SECONDS секунд читает из основной базы и видит свои посты,
+комментарии и подписки. Срок хранится в cookie REPLICA_PIN_COOKIE.
+Записью считается выполненный INSERT, UPDATE или DELETE, зафиксированный
+в основной базе; одно обращение к db_for_write (get_or_create, который
+нашёл строку) пользователя не закрепляет.
+
+Без настроенных реплик роутер ничего не меняет.
+"""
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import connections, transaction
+
+WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+_state = threading.local()
+
+
+def use_replica():
+    return getattr(_state, "use_replica", False)
+
+
+def mark_write():
+    _state.wrote = True
+
+
+def record_writes(execute, sql, params, many, context):
+    """execute_wrapper: закрепляет пользователя, когда запись
+    зафиксирована; откаченная запись читать нечего."""
+    result = execute(sql, params, many, context)
+    if sql.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+        transaction.on_commit(mark_write, using=context["connection"].alias)
+    return result
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if settings.DATABASE_REPLICAS and use_replica():
+            return random.choice(settings.DATABASE_REPLICAS)
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная база.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+def pinned_until(request):
+    try:
+        return float(request.COOKIES.get(settings.REPLICA_PIN_COOKIE, 0))
+    except ValueError:
+        return 0
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Без реплик закреплять не за чем: лишняя Set-Cookie к тому же
+        # не дала бы сохранить ответ в кэше страниц.
+        if not settings.DATABASE_REPLICAS:
+            return self.get_response(request)
+        _state.use_replica = False
+        _state.wrote = False
+        try:
+            with connections["default"].execute_wrapper(record_writes):
+                response = self.get_response(request)
+            wrote = _state.wrote
+        finally:
+            _state.use_replica = False
+            _state.wrote = False
+        if wrote:
+            pin = time.time() + settings.REPLICA_PIN_SECONDS
+            response.set_cookie(settings.REPLICA_PIN_COOKIE, f"{pin:.3f}",
+                                max_age=settings.REPLICA_PIN_SECONDS,
+                                httponly=True, samesite="Lax")
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if (settings.DATABASE_REPLICAS
+                and request.method in ("GET", "HEAD")
+                and request.resolver_match.url_name
+                in settings.REPLICA_READ_VIEWS
+                and pinned_until(request) < time.time()):
+            _state.use_replica = True
@@ -39,10 +39,10 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "sorl.thumbnail",
-    "debug_toolbar",
 ]
 
 MIDDLEWARE = [
+    "yatube.metrics.MetricsMiddleware",
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -50,15 +50,21 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
-    "debug_toolbar.middleware.DebugToolbarMiddleware",
+    "posts.page_cache.AnonymousPageCacheMiddleware",
+    "yatube.replicas.ReplicaMiddleware",
 ]
 
+# debug_toolbar нужен только при разработке.
+if DEBUG:
+    INSTALLED_APPS.append("debug_toolbar")
+    MIDDLEWARE.append("debug_toolbar.middleware.DebugToolbarMiddleware")
+
 ROOT_URLCONF = "yatube.urls"
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, "templates")
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'yatube.metrics.TimedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -68,6 +74,7 @@ TEMPLATES = [
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
                 'yatube.context_processors.year',
+                'posts.context_processors.followed_authors',
             ],
         },
     },
@@ -86,6 +93,49 @@ DATABASES = {
     }
 }
 
+# YATUBE_DB_PROFILE=production включает WAL, PRAGMA для быстрой работы
+# и постоянные соединения.
+DB_PROFILE = os.environ.get("YATUBE_DB_PROFILE", "development")
+if DB_PROFILE == "production":
+    DATABASES["default"].update({
+        "ENGINE": "yatube.backends.sqlite3",
+        "CONN_MAX_AGE": 600,
+        "OPTIONS": {
+            # Ожидание блокировки, с. Это и есть busy_timeout SQLite,
+            # поэтому отдельной PRAGMA для него нет.
+            "timeout": 5,
+            "PRAGMAS": {
+                "journal_mode": "wal",
+                "synchronous": "normal",
+                "cache_size": -64 * 1024,
+                "mmap_size": 256 * 1024 * 1024,
+                "temp_store": "memory",
+            },
+        },
+    })
+
+# Повторы записи при «database is locked»: число и начальная задержка.
+DB_LOCK_RETRIES = 4
+DB_LOCK_RETRY_DELAY = 0.05
+
+# Реплики только для чтения: пути к файлам SQLite через запятую
+# в YATUBE_DB_REPLICAS. В тестах реплики зеркалят основную базу.
+DATABASE_REPLICAS = []
+for number, path in enumerate(
+        filter(None, os.environ.get("YATUBE_DB_REPLICAS", "").split(",")),
+        start=1):
+    alias = f"replica{number}"
+    DATABASES[alias] = dict(DATABASES["default"], NAME=path,
+                            TEST={"MIRROR": "default"})
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["yatube.replicas.ReplicaRouter"]
+# Представления, которые читают с реплик.
+REPLICA_READ_VIEWS = ("index", "group", "profile", "post", "follow_index")
+# Сколько секунд после записи пользователь читает из основной базы.
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = "primary_pin"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -139,8 +189,137 @@ LOGOUT_REDIRECT_URL = "index"
 EMAIL_BACKEND = "django.core.mail.backends.filebased.EmailBackend"
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, "sent_emails")
 
+# Кэш процесса (L1) перед общим для всех воркеров кэшем (L2). Если
+# YATUBE_SHARED_CACHE_DIR не задан, L2 тоже живёт в памяти процесса.
+SHARED_CACHE_DIR = os.environ.get("YATUBE_SHARED_CACHE_DIR")
+
 CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    "default": {
+        "BACKEND": "yatube.cache.TieredCache",
+        "LOCATION": "shared",
+        "OPTIONS": {
+            "L1_MAX_ENTRIES": 2000,
+            "L1_MAX_BYTES": 32 * 1024 * 1024,
+            "L1_TIMEOUT": 5,
+            "L1_BYPASS": ("feed_version:",),
+            "LOCK_TIMEOUT": 10,
+        },
+    },
+    "shared": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "shared",
+    } if not SHARED_CACHE_DIR else {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": SHARED_CACHE_DIR,
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
 }
+
+# Feeds
+
+# Ленты, которые листаются курсорами ?before=/?after= вместо ?page=N.
+# Возможные значения: "index", "group", "follow".
+CURSOR_PAGINATED_FEEDS = ()
+# Сколько номеров страниц показывать по обе стороны от текущей
+# (по умолчанию 3) и в начале и конце списка страниц.
+PAGINATOR_WINDOWS = {"index": 3, "group": 3, "profile": 2, "follow": 2,
+                     "search": 2}
+PAGINATOR_ON_ENDS = 1
+
+# Лента подписок раскладывается по подписчикам при публикации поста,
+# если у автора не больше TIMELINE_FANOUT_LIMIT подписчиков; посты более
+# популярных авторов читаются напрямую.
+TIMELINE_FANOUT_LIMIT = 5000
+# Популярным автор перестаёт быть, только когда подписчиков остаётся
+# не больше TIMELINE_FANOUT_LIMIT - TIMELINE_FANOUT_HYSTERESIS, чтобы
+# колебания у порога не раскладывали его посты снова и снова. Посты
+# таких авторов раскладывает `manage.py rebuild_timelines --demoted`
+# (по расписанию), до того они читаются напрямую.
+TIMELINE_FANOUT_HYSTERESIS = 500
+# Сколько последних постов автора добавить в ленту при подписке.
+TIMELINE_BACKFILL = 200
+# Время жизни фрагментов лент; устаревание отслеживают версии в кэше.
+FEED_CACHE_TIMEOUT = 60 * 5
+
+# Search
+
+# "fts5" — виртуальная таблица SQLite FTS5, "python" — таблица SearchTerm,
+# "auto" — FTS5, если она есть в базе.
+SEARCH_BACKEND = "auto"
+SEARCH_MAX_RESULTS = 500
+
+# Thumbnails
+
+# Потоки, создающие миниатюры вне запроса; 0 — создавать сразу.
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_URL_TIMEOUT = 60 * 60 * 24
+THUMBNAIL_QUALITY = 85
+# Ширины вариантов изображений постов, их пропорции и форматы.
+POST_IMAGE_WIDTHS = (320, 640, 960)
+POST_IMAGE_ASPECT = (960, 339)
+POST_IMAGE_FORMATS = ("webp", "jpeg")
+POST_IMAGE_SIZES = "(max-width: 767px) 100vw, 960px"
+# Варианты неизменяемы: их имена содержат хэш содержимого.
+POST_IMAGE_VARIANTS_MAX_AGE = 60 * 60 * 24 * 365
+
+# Image uploads
+
+# Ограничения загружаемых изображений постов. Изображения больше
+# POST_IMAGE_MAX_DIMENSION по большей стороне уменьшаются при загрузке.
+POST_IMAGE_MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+POST_IMAGE_MAX_PIXELS = 50_000_000
+POST_IMAGE_MAX_DIMENSION = 2560
+POST_IMAGE_QUALITY = 85
+
+# Metrics
+
+# Доля запросов, для которых собираются метрики; 0 — не собирать.
+# По умолчанию 1 %; для отладки долю поднимают переменной окружения.
+METRICS_SAMPLE_RATE = float(os.environ.get("YATUBE_METRICS_SAMPLE_RATE", 0.01))
+# Адреса, с которых доступна страница /metrics.
+METRICS_ALLOWED_IPS = INTERNAL_IPS
+
+# Conditional GET
+
+# Меняется с каждой выкладкой, чтобы ETag страниц учитывал новые шаблоны.
+ETAG_SALT = os.environ.get("YATUBE_RELEASE", "")
+
+# Page cache
+
+# Кэш целых страниц для анонимов; при разработке выключен, чтобы
+# изменения шаблонов были видны сразу.
+PAGE_CACHE_ENABLED = not DEBUG
+PAGE_CACHE_TIMEOUT = 60 * 10
+
+# Comments
+
+# Комментарии на странице поста выводятся порциями по COMMENTS_PER_PAGE,
+# остальные подгружаются кнопкой «Показать ещё». Параметр limit не может
+# превысить COMMENTS_MAX_PER_PAGE.
+COMMENTS_PER_PAGE = 20
+COMMENTS_MAX_PER_PAGE = 100
+
+# Follows
+
+# Время жизни кэша авторов, на которых подписан пользователь; устаревание
+# отслеживает версия его ленты подписок.
+FOLLOWED_AUTHORS_TIMEOUT = 60 * 60
+# Списки подписчиков и подписок. Списки авторов, у которых в списке
+# не меньше FOLLOW_LIST_CACHE_THRESHOLD человек, кэшируются.
+FOLLOW_LIST_PER_PAGE = 30
+FOLLOW_LIST_CACHE_THRESHOLD = 1000
+FOLLOW_LIST_CACHE_TIMEOUT = 60
+# Сколько рекомендаций «Кого читать» хранить для пользователя и сколько
+# показывать в боковой панели.
+FOLLOW_SUGGESTIONS_LIMIT = 20
+FOLLOW_SUGGESTIONS_SHOWN = 5
+
+# Follow graph
+
+# Граф подписок в памяти каждого процесса (posts.follow_graph): проверки
+# подписки и счётчики без запросов к базе ценой ~8 МБ на миллион подписок.
+FOLLOW_GRAPH_ENABLED = os.environ.get("YATUBE_FOLLOW_GRAPH") == "1"
+# Сколько изменений копить до слияния с массивами графа.
+FOLLOW_GRAPH_DELTA_LIMIT = 10000
+# Как часто проверять, не менял ли подписки другой процесс.
+FOLLOW_GRAPH_MAX_STALENESS = 30
@@ -13,17 +13,25 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import os
+
 from django.conf import settings
 from django.conf.urls import handler404, handler500
 from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
+from django.views.decorators.cache import cache_control
+from django.views.static import serve
+
+from posts.thumbnails import VARIANTS_DIR
+from yatube.metrics import metrics_view
 
 urlpatterns = [
     path("about/", include("about.urls", namespace="about")),
     path("auth/", include("users.urls")),
     path("auth/", include("django.contrib.auth.urls")),
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("", include("posts.urls")),
     path("404", handler404),
     path("500", handler500),
@@ -34,6 +42,11 @@ handler500 = "posts.views.server_error"  # noqa
 
 if settings.DEBUG:
     import debug_toolbar
+    urlpatterns += static(
+        f"{settings.MEDIA_URL}{VARIANTS_DIR}/",
+        view=cache_control(max_age=settings.POST_IMAGE_VARIANTS_MAX_AGE,
+                           public=True, immutable=True)(serve),
+        document_root=os.path.join(settings.MEDIA_ROOT, VARIANTS_DIR))
     urlpatterns += static(settings.MEDIA_URL,
                           document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL,